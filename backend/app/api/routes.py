@@ -1,13 +1,20 @@
 """
 Routes API FastAPI
 """
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, File, HTTPException, Query, Response
+from sqlalchemy import select, insert, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, load_only
 from typing import List, Optional
 import logging
+import tempfile
 from datetime import datetime
 
-from app.core.database import get_db
+from pydantic import TypeAdapter
+
+from app.core.config import settings
+from app.core.database import get_db, SessionLocal
+from app.core.cache import cache_get, cache_set, cache_invalidate
 from app.models.models import (
     EvaluationResponse, EvaluationWithAnalysis, AnalysisResponse,
     ClusterResponse, ThemeResponse, InsightResponse, DashboardStats,
@@ -21,11 +28,89 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/v1", tags=["evaluations"])
 
+# asyncpg plafonne une requête à 32767 paramètres liés: les listes IN
+# plus longues sont découpées en tranches sous cette limite
+_SELECT_IN_CHUNK = 30000
+
+# Adaptateurs réutilisés par les endpoints de liste: un seul passage de
+# validation/sérialisation par réponse au lieu d'un appel Pydantic par ligne
+evaluation_list_adapter = TypeAdapter(List[EvaluationWithAnalysis])
+theme_list_adapter = TypeAdapter(List[ThemeResponse])
+cluster_list_adapter = TypeAdapter(List[ClusterResponse])
+insight_list_adapter = TypeAdapter(List[InsightResponse])
+
+
+async def process_evaluations_task(evaluation_ids: List[int]) -> None:
+    """
+    Tâche de fond: analyse NLP d'un upload.
+
+    S'exécute après l'envoi de la réponse HTTP, avec sa propre session
+    (celle de la requête est fermée à ce moment-là).
+    """
+    async with SessionLocal() as db:
+        try:
+            evaluations = []
+            for start in range(0, len(evaluation_ids), _SELECT_IN_CHUNK):
+                evaluations.extend((await db.execute(
+                    select(Evaluation).where(
+                        Evaluation.id.in_(
+                            evaluation_ids[start:start + _SELECT_IN_CHUNK]
+                        )
+                    )
+                )).scalars().all())
+
+            logger.info(f"Processing {len(evaluations)} evaluations with NLP")
+            nlp_service = get_nlp_service()
+            await nlp_service.process_batch(evaluations, db)
+
+            # Recalculer les agrégats précalculés du dashboard
+            await AnalyticsService.refresh_aggregates(db)
+
+            # Les données agrégées ont changé: invalider les caches de lecture
+            await cache_invalidate(
+                "dashboard:*", "themes:*", "clusters:*"
+            )
+        except Exception as e:
+            logger.error(f"Error in background processing: {e}")
+
+
+async def generate_insights_task() -> None:
+    """
+    Tâche de fond: régénère les insights, indépendamment du pipeline NLP.
+
+    Un échec ici n'empêche pas les analyses d'être persistées.
+    """
+    async with SessionLocal() as db:
+        try:
+            await AnalyticsService.generate_insights(db)
+            await cache_invalidate("dashboard:*", "insights:*")
+        except Exception as e:
+            logger.error(f"Error generating insights: {e}")
+
+
+async def prewarm_dashboard_cache() -> None:
+    """
+    Recalcule les statistiques du dashboard et les pousse dans le cache.
+
+    Appelé périodiquement par la tâche planifiée du lifespan pour que les
+    utilisateurs ne paient jamais le coût du calcul à froid.
+    """
+    async with SessionLocal() as db:
+        stats = await AnalyticsService.get_dashboard_stats(db)
+        payload = DashboardStats(**stats).model_dump(mode="json")
+        # TTL supérieur à l'intervalle pour éviter les trous entre deux passages
+        await cache_set(
+            "dashboard:stats",
+            payload,
+            ttl=settings.DASHBOARD_PREWARM_INTERVAL + 60
+        )
+
 
 @router.post("/upload", response_model=UploadResponse)
 async def upload_file(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Upload et traitement d'un fichier d'évaluations
@@ -39,61 +124,85 @@ async def upload_file(
                 status_code=400,
                 detail=f"Unsupported file format: {ext}"
             )
-        
-        # Lire le contenu
-        content = await file.read()
-        
+
+        # Lire le contenu par morceaux: les gros fichiers sont déversés sur
+        # disque au lieu d'être chargés entiers en mémoire
+        spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        size = 0
+        while chunk := await file.read(64 * 1024):
+            size += len(chunk)
+            if size > settings.MAX_UPLOAD_SIZE:
+                # Libérer tout de suite le tampon (potentiellement déversé
+                # sur disque) au lieu d'attendre le ramasse-miettes
+                spool.close()
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File exceeds maximum upload size of {settings.MAX_UPLOAD_SIZE} bytes"
+                )
+            spool.write(chunk)
+        spool.seek(0)
+
         # Parser le fichier
         logger.info(f"Parsing file: {filename}")
-        evaluation_data = FileParser.parse_file(content, filename)
-        
+        with spool:
+            evaluation_data = FileParser.parse_file(spool, filename)
+
         if not evaluation_data:
             raise HTTPException(
                 status_code=400,
                 detail="No valid evaluation data found in file"
             )
-        
-        # Créer les évaluations en DB
+
+        # Dédupliquer en quelques SELECT ... IN au lieu d'un SELECT par
+        # ligne (par tranches pour rester sous la limite asyncpg)
+        ids = [e.evaluation_id for e in evaluation_data]
+        existing_ids = set()
+        for start in range(0, len(ids), _SELECT_IN_CHUNK):
+            existing_ids.update((await db.execute(
+                select(Evaluation.evaluation_id).where(
+                    Evaluation.evaluation_id.in_(ids[start:start + _SELECT_IN_CHUNK])
+                )
+            )).scalars().all())
+
+        if existing_ids:
+            logger.warning(f"{len(existing_ids)} evaluations already exist, skipping")
+
+        rows = [
+            {**eval_data.model_dump(), "file_source": filename}
+            for eval_data in evaluation_data
+            if eval_data.evaluation_id not in existing_ids
+        ]
+
+        # Insertion en masse avec RETURNING pour récupérer les lignes créées
         evaluations = []
-        for eval_data in evaluation_data:
-            # Vérifier si l'évaluation existe déjà
-            existing = db.query(Evaluation).filter(
-                Evaluation.evaluation_id == eval_data.evaluation_id
-            ).first()
-            
-            if existing:
-                logger.warning(f"Evaluation {eval_data.evaluation_id} already exists, skipping")
-                continue
-            
-            evaluation = Evaluation(
-                **eval_data.model_dump(),
-                file_source=filename
+        if rows:
+            evaluations = (await db.execute(
+                insert(Evaluation).returning(Evaluation), rows
+            )).scalars().all()
+
+        await db.commit()
+
+        # Déléguer le NLP à une tâche de fond pour répondre immédiatement;
+        # la génération d'insights est planifiée séparément
+        if evaluations:
+            background_tasks.add_task(
+                process_evaluations_task,
+                [evaluation.id for evaluation in evaluations]
             )
-            db.add(evaluation)
-            evaluations.append(evaluation)
-        
-        db.commit()
-        
-        # Rafraîchir pour obtenir les IDs
-        for evaluation in evaluations:
-            db.refresh(evaluation)
-        
-        # Traiter les évaluations avec NLP
-        logger.info(f"Processing {len(evaluations)} evaluations with NLP")
-        nlp_service = get_nlp_service()
-        analyses = nlp_service.process_batch(evaluations, db)
-        
-        # Générer des insights
-        AnalyticsService.generate_insights(db)
-        
+            background_tasks.add_task(generate_insights_task)
+
         return UploadResponse(
-            message="File processed successfully",
+            message="File accepted, processing started",
             file_name=filename,
             total_evaluations=len(evaluations),
             processing_started=True,
             job_id=None
         )
-        
+
+    except HTTPException:
+        # Laisser passer les erreurs HTTP volontaires (400, 413) au lieu
+        # de les requalifier en 500 par le filet générique ci-dessous
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -102,130 +211,203 @@ async def upload_file(
 
 
 @router.get("/evaluations", response_model=List[EvaluationWithAnalysis])
-def get_evaluations(
+async def get_evaluations(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    after_id: Optional[int] = None,
     formation_type: Optional[str] = None,
     formateur_id: Optional[str] = None,
     langue: Optional[str] = None,
     sentiment: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Récupère les évaluations avec filtres optionnels
+
+    La pagination se fait par curseur (`after_id` = dernier id de la page
+    précédente); `skip` reste supporté pour compatibilité. Le nombre total
+    de résultats filtrés est renvoyé dans l'en-tête X-Total-Count.
     """
-    query = db.query(Evaluation)
-    
+    # Ne charger que les colonnes exposées par la réponse: l'embedding
+    # (le plus lourd de la table analyses) reste en base
+    query = select(Evaluation).options(
+        load_only(
+            Evaluation.evaluation_id, Evaluation.formation_id,
+            Evaluation.type_formation, Evaluation.formateur_id,
+            Evaluation.satisfaction, Evaluation.contenu,
+            Evaluation.logistique, Evaluation.applicabilite,
+            Evaluation.commentaire, Evaluation.langue,
+            Evaluation.date, Evaluation.created_at
+        ),
+        selectinload(Evaluation.analysis).load_only(
+            Analysis.evaluation_id, Analysis.detected_language,
+            Analysis.sentiment, Analysis.sentiment_score,
+            Analysis.themes, Analysis.entities,
+            Analysis.cluster_id, Analysis.processed_at
+        )
+    )
+    count_query = select(func.count(Evaluation.id))
+
     if formation_type:
-        query = query.filter(Evaluation.type_formation == formation_type)
+        query = query.where(Evaluation.type_formation == formation_type)
+        count_query = count_query.where(Evaluation.type_formation == formation_type)
     if formateur_id:
-        query = query.filter(Evaluation.formateur_id == formateur_id)
+        query = query.where(Evaluation.formateur_id == formateur_id)
+        count_query = count_query.where(Evaluation.formateur_id == formateur_id)
     if langue:
-        query = query.filter(Evaluation.langue == langue)
-    
-    evaluations = query.offset(skip).limit(limit).all()
-    
-    # Joindre les analyses
-    results = []
-    for eval in evaluations:
-        eval_dict = EvaluationResponse.model_validate(eval)
-        result = EvaluationWithAnalysis(**eval_dict.model_dump())
-        
-        if eval.analysis:
-            # Filtrer par sentiment si demandé
-            if sentiment and eval.analysis.sentiment != sentiment:
-                continue
-            result.analysis = AnalysisResponse.model_validate(eval.analysis)
-        
-        results.append(result)
-    
-    return results
+        query = query.where(Evaluation.langue == langue)
+        count_query = count_query.where(Evaluation.langue == langue)
+    if sentiment:
+        # Filtrer par sentiment directement en SQL
+        query = query.join(Analysis).where(Analysis.sentiment == sentiment)
+        count_query = count_query.join(Analysis).where(Analysis.sentiment == sentiment)
+
+    total = (await db.execute(count_query)).scalar() or 0
+    response.headers["X-Total-Count"] = str(total)
+
+    # Keyset: WHERE id > :after_id évite le parcours OFFSET des pages profondes
+    query = query.order_by(Evaluation.id)
+    if after_id is not None:
+        query = query.where(Evaluation.id > after_id)
+    elif skip:
+        query = query.offset(skip)
+
+    evaluations = (await db.execute(query.limit(limit))).scalars().all()
+
+    # Validation directe (l'analyse imbriquée est convertie par Pydantic)
+    return evaluation_list_adapter.validate_python(evaluations)
 
 
 @router.get("/evaluations/{evaluation_id}", response_model=EvaluationWithAnalysis)
-def get_evaluation(evaluation_id: int, db: Session = Depends(get_db)):
+async def get_evaluation(evaluation_id: int, db: AsyncSession = Depends(get_db)):
     """
     Récupère une évaluation spécifique avec son analyse
     """
-    evaluation = db.query(Evaluation).filter(Evaluation.id == evaluation_id).first()
-    
+    evaluation = (await db.execute(
+        select(Evaluation)
+        .options(selectinload(Evaluation.analysis))
+        .where(Evaluation.id == evaluation_id)
+    )).scalars().first()
+
     if not evaluation:
         raise HTTPException(status_code=404, detail="Evaluation not found")
-    
-    eval_dict = EvaluationResponse.model_validate(evaluation)
-    result = EvaluationWithAnalysis(**eval_dict.model_dump())
-    
-    if evaluation.analysis:
-        result.analysis = AnalysisResponse.model_validate(evaluation.analysis)
-    
-    return result
+
+    return EvaluationWithAnalysis.model_validate(evaluation)
 
 
 @router.get("/dashboard/stats", response_model=DashboardStats)
-def get_dashboard_stats(db: Session = Depends(get_db)):
+async def get_dashboard_stats(db: AsyncSession = Depends(get_db)):
     """
     Récupère les statistiques pour le dashboard
     """
-    stats = AnalyticsService.get_dashboard_stats(db)
-    return DashboardStats(**stats)
+    cached = await cache_get("dashboard:stats")
+    if cached is not None:
+        return cached
+
+    stats = await AnalyticsService.get_dashboard_stats(db)
+    payload = DashboardStats(**stats).model_dump(mode="json")
+    await cache_set("dashboard:stats", payload)
+    return payload
 
 
 @router.get("/themes", response_model=List[ThemeResponse])
-def get_themes(
+async def get_themes(
     language: Optional[str] = None,
     top_n: int = 20,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Récupère les thèmes globaux
     """
-    query = db.query(Theme).order_by(Theme.frequency.desc())
-    
+    cache_key = f"themes:{language}:{top_n}"
+    cached = await cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    query = select(Theme).options(
+        load_only(Theme.theme_name, Theme.frequency, Theme.keywords, Theme.language)
+    ).order_by(Theme.frequency.desc())
+
     if language:
-        query = query.filter(Theme.language == language)
-    
-    themes = query.limit(top_n).all()
-    return [ThemeResponse.model_validate(theme) for theme in themes]
+        query = query.where(Theme.language == language)
+
+    themes = (await db.execute(query.limit(top_n))).scalars().all()
+    payload = theme_list_adapter.dump_python(
+        theme_list_adapter.validate_python(themes), mode="json"
+    )
+    await cache_set(cache_key, payload)
+    return payload
 
 
 @router.get("/clusters", response_model=List[ClusterResponse])
-def get_clusters(db: Session = Depends(get_db)):
+async def get_clusters(db: AsyncSession = Depends(get_db)):
     """
     Récupère les clusters
     """
-    clusters = db.query(Cluster).all()
-    return [ClusterResponse.model_validate(cluster) for cluster in clusters]
+    cached = await cache_get("clusters:all")
+    if cached is not None:
+        return cached
+
+    # Le centroïde (vecteur complet) n'est pas exposé: ne pas le charger
+    clusters = (await db.execute(
+        select(Cluster).options(
+            load_only(
+                Cluster.cluster_label, Cluster.cluster_number, Cluster.size,
+                Cluster.representative_themes, Cluster.avg_sentiment
+            )
+        )
+    )).scalars().all()
+    payload = cluster_list_adapter.dump_python(
+        cluster_list_adapter.validate_python(clusters), mode="json"
+    )
+    await cache_set("clusters:all", payload)
+    return payload
 
 
 @router.get("/insights", response_model=List[InsightResponse])
-def get_insights(
+async def get_insights(
     insight_type: Optional[str] = None,
     limit: int = 10,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Récupère les insights
     """
-    query = db.query(Insight).order_by(Insight.created_at.desc())
-    
+    cache_key = f"insights:{insight_type}:{limit}"
+    cached = await cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    query = select(Insight).options(
+        load_only(
+            Insight.insight_type, Insight.title, Insight.description,
+            Insight.confidence, Insight.data, Insight.created_at
+        )
+    ).order_by(Insight.created_at.desc())
+
     if insight_type:
-        query = query.filter(Insight.insight_type == insight_type)
-    
-    insights = query.limit(limit).all()
-    return [InsightResponse.model_validate(insight) for insight in insights]
+        query = query.where(Insight.insight_type == insight_type)
+
+    insights = (await db.execute(query.limit(limit))).scalars().all()
+    payload = insight_list_adapter.dump_python(
+        insight_list_adapter.validate_python(insights), mode="json"
+    )
+    await cache_set(cache_key, payload)
+    return payload
 
 
 @router.get("/analytics/trends")
-def get_trends(
+async def get_trends(
     days: int = Query(default=30, ge=1, le=365),
     formation_type: Optional[str] = None,
     formateur_id: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Analyse les tendances
     """
-    return AnalyticsService.analyze_trends(
+    return await AnalyticsService.analyze_trends(
         db,
         days=days,
         formation_type=formation_type,
@@ -234,32 +416,36 @@ def get_trends(
 
 
 @router.get("/analytics/correlations")
-def get_correlations(db: Session = Depends(get_db)):
+async def get_correlations(db: AsyncSession = Depends(get_db)):
     """
     Analyse les corrélations
     """
-    return AnalyticsService.analyze_correlations(db)
+    return await AnalyticsService.analyze_correlations(db)
 
 
 @router.get("/analytics/compare")
-def compare_formations(
+async def compare_formations(
     formation1: str,
     formation2: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Compare deux formations
     """
-    return AnalyticsService.compare_formations(db, formation1, formation2)
+    return await AnalyticsService.compare_formations(db, formation1, formation2)
 
 
 @router.post("/analytics/generate-insights")
-def generate_insights(db: Session = Depends(get_db)):
+async def generate_insights(db: AsyncSession = Depends(get_db)):
     """
     Génère de nouveaux insights
     """
-    insights = AnalyticsService.generate_insights(db)
+    # Réutilise directement les objets rendus par le service: avec
+    # expire_on_commit=False, leurs attributs restent chargés après le
+    # commit et la réponse ne déclenche aucun SELECT de rafraîchissement
+    insights = await AnalyticsService.generate_insights(db)
+    await cache_invalidate("dashboard:*", "insights:*")
     return {
         "message": f"{len(insights)} new insights generated",
-        "insights": [InsightResponse.model_validate(i) for i in insights]
+        "insights": insight_list_adapter.validate_python(insights)
     }
@@ -0,0 +1,86 @@
+"""
+Cache Redis pour les endpoints de lecture
+"""
+import json
+import logging
+from typing import Any, Optional
+
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# TTL par défaut des entrées de cache (secondes)
+DEFAULT_TTL = 60
+
+_redis: Optional[aioredis.Redis] = None
+
+
+def get_redis() -> aioredis.Redis:
+    """Retourne le client Redis singleton"""
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(
+            settings.REDIS_URL,
+            encoding="utf-8",
+            decode_responses=True
+        )
+    return _redis
+
+
+async def cache_get(key: str) -> Optional[Any]:
+    """
+    Lit une entrée de cache (None si absente ou Redis indisponible)
+
+    Args:
+        key: Clé de cache
+
+    Returns:
+        Valeur désérialisée ou None
+    """
+    try:
+        value = await get_redis().get(key)
+        if value is not None:
+            return json.loads(value)
+    except Exception as e:
+        logger.warning(f"Cache read failed for {key}: {e}")
+    return None
+
+
+async def cache_set(key: str, value: Any, ttl: int = DEFAULT_TTL) -> None:
+    """
+    Écrit une entrée de cache (silencieux si Redis indisponible)
+
+    Args:
+        key: Clé de cache
+        value: Valeur JSON-sérialisable
+        ttl: Durée de vie en secondes
+    """
+    try:
+        await get_redis().set(key, json.dumps(value), ex=ttl)
+    except Exception as e:
+        logger.warning(f"Cache write failed for {key}: {e}")
+
+
+async def cache_invalidate(*patterns: str) -> None:
+    """
+    Supprime les clés correspondant aux patterns donnés (glob Redis)
+
+    Args:
+        patterns: Patterns de clés à invalider (ex: "themes:*")
+    """
+    try:
+        redis = get_redis()
+        keys = []
+        for pattern in patterns:
+            async for key in redis.scan_iter(match=pattern):
+                keys.append(key)
+        if keys:
+            # Une seule suppression pipelinée au lieu d'un DELETE par clé
+            async with redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.delete(key)
+                await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Cache invalidation failed: {e}")
@@ -1,15 +1,15 @@
 """
-Configuration de la base de données
+Configuration de la base de données (moteur asynchrone asyncpg)
 """
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from typing import AsyncGenerator
 from app.core.config import settings
 from app.models.models import Base
 
 
-# Création du moteur de base de données
-engine = create_engine(
+# Création du moteur de base de données asynchrone
+engine = create_async_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,
     pool_size=10,
@@ -17,22 +17,39 @@ engine = create_engine(
 )
 
 # Session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = async_sessionmaker(
+    engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
 
 
-def get_db() -> Generator[Session, None, None]:
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """
     Dépendance FastAPI pour obtenir une session de base de données
     """
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-def init_db() -> None:
+async def init_db() -> None:
     """
     Initialise la base de données (création des tables)
     """
-    Base.metadata.create_all(bind=engine)
+    async with engine.begin() as conn:
+        # Extension requise pour les colonnes VECTOR (embeddings)
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        await conn.run_sync(Base.metadata.create_all)
+        # Agrégats globaux précalculés pour le dashboard; rafraîchis après
+        # chaque upload (les données ne changent que par upload)
+        await conn.execute(text("""
+            CREATE MATERIALIZED VIEW IF NOT EXISTS evaluation_stats AS
+            SELECT
+                count(id) AS total_evaluations,
+                avg(satisfaction) AS avg_satisfaction,
+                avg(contenu) AS avg_contenu,
+                avg(logistique) AS avg_logistique,
+                avg(applicabilite) AS avg_applicabilite
+            FROM evaluations
+        """))
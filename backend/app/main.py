@@ -3,12 +3,15 @@ Application FastAPI principale
 """
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
 from app.core.database import init_db
-from app.api.routes import router
+from app.api.routes import router, prewarm_dashboard_cache
+from app.services.nlp_service import get_nlp_service
 
 # Configuration du logging
 logging.basicConfig(
@@ -18,18 +21,41 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+async def _prewarm_loop() -> None:
+    """Rafraîchit périodiquement le cache du dashboard"""
+    while True:
+        try:
+            await prewarm_dashboard_cache()
+        except Exception as e:
+            logger.error(f"Dashboard cache prewarm failed: {e}")
+        await asyncio.sleep(settings.DASHBOARD_PREWARM_INTERVAL)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifecycle events"""
     # Startup
     logger.info("Starting up...")
-    init_db()
+    await init_db()
     logger.info("Database initialized")
     
+    # Charger les modèles NLP une fois au démarrage: le singleton est
+    # ensuite partagé par toutes les requêtes, plus de chargement à froid
+    # sur le premier upload
+    await asyncio.to_thread(get_nlp_service)
+    logger.info("NLP models loaded")
+    
+    prewarm_task = None
+    if settings.DASHBOARD_PREWARM_INTERVAL > 0:
+        prewarm_task = asyncio.create_task(_prewarm_loop())
+        logger.info("Dashboard cache prewarm task started")
+    
     yield
     
     # Shutdown
     logger.info("Shutting down...")
+    if prewarm_task:
+        prewarm_task.cancel()
 
 
 # Créer l'application
@@ -37,7 +63,8 @@ app = FastAPI(
     title=settings.APP_NAME,
     version=settings.VERSION,
     lifespan=lifespan,
-    description="Système d'analyse automatisée des évaluations de formation avec NLP multilingue"
+    description="Système d'analyse automatisée des évaluations de formation avec NLP multilingue",
+    default_response_class=ORJSONResponse
 )
 
 # CORS - TEMPORARILY ALLOW ALL FOR DEBUGGING
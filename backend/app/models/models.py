@@ -1,9 +1,11 @@
 """
 Modèles de données SQLAlchemy et Pydantic
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, JSON, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, JSON, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
+from pgvector.sqlalchemy import HALFVEC
+from app.core.config import settings
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field
@@ -41,6 +43,13 @@ class Evaluation(Base):
     
     # Relations
     analysis = relationship("Analysis", back_populates="evaluation", uselist=False)
+    
+    __table_args__ = (
+        # Couvre la combinaison de filtres de GET /evaluations
+        Index('ix_evaluations_filter_set', 'type_formation', 'formateur_id', 'langue'),
+        # Couvre la fenêtre temporelle + filtres de /analytics/trends
+        Index('ix_evaluations_date_filters', 'date', 'type_formation', 'formateur_id'),
+    )
 
 
 class Analysis(Base):
@@ -61,7 +70,8 @@ class Analysis(Base):
     
     # Clustering
     cluster_id = Column(Integer, ForeignKey("clusters.id"), nullable=True)
-    embedding = Column(JSON)  # Vecteur d'embedding
+    # Vecteur d'embedding en demi-précision: stockage et bande passante divisés par deux
+    embedding = Column(HALFVEC(settings.EMBEDDING_DIM), nullable=True)
     
     # Métadonnées
     processed_at = Column(DateTime, default=datetime.utcnow)
@@ -1,87 +1,119 @@
 """
 Service d'analyse quantitative automatisée
 """
-import pandas as pd
 import numpy as np
 from typing import List, Dict, Optional, Tuple
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import select, insert, func, desc, text
+from sqlalchemy.orm import load_only
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 import logging
+import time
 from app.models.models import Evaluation, Analysis, Cluster, Theme, Insight, SentimentEnum
-from scipy import stats
 
 logger = logging.getLogger(__name__)
 
+# Cache mémoire local au worker pour les stats dashboard (L1 devant Redis):
+# clé -> (timestamp monotone, résultat)
+_stats_cache: Dict[str, Tuple[float, Dict]] = {}
+_STATS_CACHE_TTL = 30  # secondes
+
 
 class AnalyticsService:
     """
     Service d'analyse quantitative et génération d'insights
     """
-    
+
     @staticmethod
-    def get_dashboard_stats(db: Session) -> Dict[str, any]:
+    async def get_dashboard_stats(db: AsyncSession) -> Dict[str, any]:
         """
         Calcule les statistiques pour le dashboard
-        
+
         Args:
             db: Session de base de données
-            
+
         Returns:
             Dict avec toutes les statistiques
         """
-        # Nombre total d'évaluations
-        total_evaluations = db.query(func.count(Evaluation.id)).scalar()
-        
-        # Moyennes des critères
-        avg_stats = db.query(
-            func.avg(Evaluation.satisfaction).label('avg_satisfaction'),
-            func.avg(Evaluation.contenu).label('avg_contenu'),
-            func.avg(Evaluation.logistique).label('avg_logistique'),
-            func.avg(Evaluation.applicabilite).label('avg_applicabilite')
-        ).first()
-        
+        cache_key = "dashboard:top50"
+        cached = _stats_cache.get(cache_key)
+        if cached and time.monotonic() - cached[0] < _STATS_CACHE_TTL:
+            return cached[1]
+
+        # Compte total et moyennes lus depuis la vue matérialisée; repli sur
+        # le calcul direct si elle n'existe pas encore
+        try:
+            avg_stats = (await db.execute(
+                text("SELECT * FROM evaluation_stats")
+            )).first()
+        except Exception as e:
+            logger.warning(f"Falling back to live aggregates: {e}")
+            await db.rollback()
+            avg_stats = None
+
+        if avg_stats is None:
+            avg_stats = (await db.execute(
+                select(
+                    func.count(Evaluation.id).label('total_evaluations'),
+                    func.avg(Evaluation.satisfaction).label('avg_satisfaction'),
+                    func.avg(Evaluation.contenu).label('avg_contenu'),
+                    func.avg(Evaluation.logistique).label('avg_logistique'),
+                    func.avg(Evaluation.applicabilite).label('avg_applicabilite')
+                )
+            )).first()
+
         # Distribution des sentiments
-        sentiment_dist = db.query(
-            Analysis.sentiment,
-            func.count(Analysis.id)
-        ).group_by(Analysis.sentiment).all()
-        
+        sentiment_dist = (await db.execute(
+            select(
+                Analysis.sentiment,
+                func.count(Analysis.id)
+            ).group_by(Analysis.sentiment)
+        )).all()
+
         sentiment_distribution = {
             sentiment: count for sentiment, count in sentiment_dist
         }
-        
+
         # Distribution des langues
-        lang_dist = db.query(
-            Evaluation.langue,
-            func.count(Evaluation.id)
-        ).group_by(Evaluation.langue).all()
-        
+        lang_dist = (await db.execute(
+            select(
+                Evaluation.langue,
+                func.count(Evaluation.id)
+            ).group_by(Evaluation.langue)
+        )).all()
+
         language_distribution = {
             lang: count for lang, count in lang_dist
         }
-        
+
         # Types de formation
-        formation_dist = db.query(
-            Evaluation.type_formation,
-            func.count(Evaluation.id)
-        ).group_by(Evaluation.type_formation).all()
-        
+        formation_dist = (await db.execute(
+            select(
+                Evaluation.type_formation,
+                func.count(Evaluation.id)
+            ).group_by(Evaluation.type_formation)
+        )).all()
+
         formation_types = {
             type_form: count for type_form, count in formation_dist
         }
-        
+
         # Thèmes catégorisés en 4 catégories générales
         from app.services.theme_categorizer import theme_categorizer
-        categorized_themes = theme_categorizer.get_categorized_themes(db, top_n=50)
-        
-        # Insights récents
-        recent_insights = db.query(Insight).order_by(
-            desc(Insight.created_at)
-        ).limit(5).all()
-        
-        return {
-            "total_evaluations": total_evaluations or 0,
+        categorized_themes = await theme_categorizer.get_categorized_themes(db, top_n=50)
+
+        # Insights récents (seules les colonnes exposées par InsightResponse)
+        recent_insights = (await db.execute(
+            select(Insight).options(
+                load_only(
+                    Insight.insight_type, Insight.title, Insight.description,
+                    Insight.confidence, Insight.data, Insight.created_at
+                )
+            ).order_by(desc(Insight.created_at)).limit(5)
+        )).scalars().all()
+
+        result = {
+            "total_evaluations": avg_stats.total_evaluations or 0,
             "avg_satisfaction": float(avg_stats.avg_satisfaction or 0),
             "avg_contenu": float(avg_stats.avg_contenu or 0),
             "avg_logistique": float(avg_stats.avg_logistique or 0),
@@ -92,175 +124,220 @@ class AnalyticsService:
             "theme_categories": categorized_themes,  # 4 catégories générales
             "recent_insights": recent_insights
         }
-    
+        _stats_cache[cache_key] = (time.monotonic(), result)
+        return result
+
     @staticmethod
-    def analyze_trends(
-        db: Session,
+    async def refresh_aggregates(db: AsyncSession) -> None:
+        """
+        Rafraîchit la vue matérialisée des agrégats d'évaluations
+
+        Args:
+            db: Session de base de données
+        """
+        try:
+            await db.execute(text("REFRESH MATERIALIZED VIEW evaluation_stats"))
+            await db.commit()
+        except Exception as e:
+            logger.error(f"Error refreshing evaluation_stats: {e}")
+            await db.rollback()
+        # Les données viennent de changer: purger le cache L1, sinon la
+        # prochaine lecture (ou le prewarm) réécrirait dans Redis le
+        # payload d'avant l'upload malgré l'invalidation des clés
+        _stats_cache.clear()
+
+    @staticmethod
+    async def analyze_trends(
+        db: AsyncSession,
         days: int = 30,
         formation_type: Optional[str] = None,
         formateur_id: Optional[str] = None
     ) -> Dict[str, any]:
         """
         Analyse les tendances temporelles
-        
+
         Args:
             db: Session de base de données
             days: Nombre de jours à analyser
             formation_type: Filtrer par type de formation
             formateur_id: Filtrer par formateur
-            
+
         Returns:
             Dict avec les tendances
         """
         # Date de début
         start_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Query de base
-        query = db.query(Evaluation).filter(Evaluation.date >= start_date)
-        
+
+        # Agrégation hebdomadaire directement en SQL: la base renvoie une
+        # ligne par semaine au lieu d'une ligne par évaluation
+        week = func.date_trunc('week', Evaluation.date).label('week')
+        query = select(
+            week,
+            func.count(Evaluation.id).label('count'),
+            func.avg(Evaluation.satisfaction).label('satisfaction'),
+            func.avg(Evaluation.contenu).label('contenu'),
+            func.avg(Evaluation.logistique).label('logistique'),
+            func.avg(Evaluation.applicabilite).label('applicabilite')
+        ).where(Evaluation.date >= start_date)
+
         if formation_type:
-            query = query.filter(Evaluation.type_formation == formation_type)
+            query = query.where(Evaluation.type_formation == formation_type)
         if formateur_id:
-            query = query.filter(Evaluation.formateur_id == formateur_id)
-        
-        evaluations = query.all()
-        
-        if not evaluations:
+            query = query.where(Evaluation.formateur_id == formateur_id)
+
+        weekly = (await db.execute(query.group_by(week).order_by(week))).all()
+
+        if not weekly:
             return {"error": "No data for the specified period"}
-        
-        # Convertir en DataFrame
-        df = pd.DataFrame([
+
+        weekly_data = [
             {
-                "date": e.date,
-                "satisfaction": e.satisfaction,
-                "contenu": e.contenu,
-                "logistique": e.logistique,
-                "applicabilite": e.applicabilite,
+                "week": row.week.date().isoformat(),
+                "satisfaction": float(row.satisfaction),
+                "contenu": float(row.contenu),
+                "logistique": float(row.logistique),
+                "applicabilite": float(row.applicabilite),
             }
-            for e in evaluations
-        ])
-        
-        # Grouper par semaine
-        df['week'] = pd.to_datetime(df['date']).dt.to_period('W')
-        weekly = df.groupby('week').agg({
-            'satisfaction': 'mean',
-            'contenu': 'mean',
-            'logistique': 'mean',
-            'applicabilite': 'mean',
-        }).reset_index()
-        
-        # Calculer les tendances (régression linéaire simple)
+            for row in weekly
+        ]
+
+        # Calculer les tendances: pente en forme fermée cov(x,y)/var(x),
+        # x étant la même séquence 0..n-1 pour les quatre critères
         trends = {}
+        n_weeks = len(weekly)
+        if n_weeks > 1:
+            x = np.arange(n_weeks, dtype=np.float64)
+            x_centered = x - x.mean()
+            x_var = float((x_centered ** 2).sum())
         for col in ['satisfaction', 'contenu', 'logistique', 'applicabilite']:
-            if len(weekly) > 1:
-                x = np.arange(len(weekly))
-                y = weekly[col].values
-                slope, _, _, _, _ = stats.linregress(x, y)
+            if n_weeks > 1:
+                y = np.array([entry[col] for entry in weekly_data], dtype=np.float64)
+                slope = float((x_centered * (y - y.mean())).sum() / x_var)
                 trends[col] = {
                     "trend": "increasing" if slope > 0.05 else "decreasing" if slope < -0.05 else "stable",
-                    "slope": float(slope)
+                    "slope": slope
                 }
             else:
                 trends[col] = {"trend": "stable", "slope": 0.0}
-        
+
         return {
             "period_days": days,
-            "total_evaluations": len(evaluations),
-            "weekly_data": weekly.to_dict(orient='records'),
+            "total_evaluations": int(sum(row.count for row in weekly)),
+            "weekly_data": weekly_data,
             "trends": trends
         }
-    
+
     @staticmethod
-    def analyze_correlations(db: Session) -> Dict[str, any]:
+    async def analyze_correlations(db: AsyncSession) -> Dict[str, any]:
         """
         Analyse les corrélations entre critères
-        
+
         Args:
             db: Session de base de données
-            
+
         Returns:
             Dict avec les corrélations
         """
-        # Récupérer toutes les évaluations
-        evaluations = db.query(Evaluation).all()
-        
-        if len(evaluations) < 10:
+        # Récupérer uniquement les colonnes numériques, pas d'objets ORM
+        rows = (await db.execute(
+            select(
+                Evaluation.satisfaction,
+                Evaluation.contenu,
+                Evaluation.logistique,
+                Evaluation.applicabilite
+            )
+        )).all()
+
+        if len(rows) < 10:
             return {"error": "Not enough data for correlation analysis"}
-        
-        # Convertir en DataFrame
-        df = pd.DataFrame([
-            {
-                "satisfaction": e.satisfaction,
-                "contenu": e.contenu,
-                "logistique": e.logistique,
-                "applicabilite": e.applicabilite,
+
+        criteria = ["satisfaction", "contenu", "logistique", "applicabilite"]
+
+        # Matrice de corrélation directement en numpy (pas de DataFrame)
+        corr_matrix = np.corrcoef(np.asarray(rows, dtype=np.float64), rowvar=False)
+
+        correlation_matrix = {
+            col1: {
+                col2: float(corr_matrix[i, j]) for j, col2 in enumerate(criteria)
             }
-            for e in evaluations
-        ])
-        
-        # Calculer la matrice de corrélation
-        corr_matrix = df.corr()
-        
+            for i, col1 in enumerate(criteria)
+        }
+
         return {
-            "correlation_matrix": corr_matrix.to_dict(),
-            "strong_correlations": AnalyticsService._find_strong_correlations(corr_matrix)
+            "correlation_matrix": correlation_matrix,
+            "strong_correlations": AnalyticsService._find_strong_correlations(corr_matrix, criteria)
         }
-    
+
     @staticmethod
     def _find_strong_correlations(
-        corr_matrix: pd.DataFrame, 
+        corr_matrix: np.ndarray,
+        columns: List[str],
         threshold: float = 0.7
     ) -> List[Dict[str, any]]:
         """
         Trouve les corrélations fortes
-        
+
         Args:
-            corr_matrix: Matrice de corrélation
+            corr_matrix: Matrice de corrélation (carrée)
+            columns: Noms des variables, dans l'ordre de la matrice
             threshold: Seuil de corrélation
-            
+
         Returns:
             Liste de corrélations fortes
         """
-        strong_corr = []
-        
-        for i in range(len(corr_matrix.columns)):
-            for j in range(i + 1, len(corr_matrix.columns)):
-                corr_value = corr_matrix.iloc[i, j]
-                if abs(corr_value) >= threshold:
-                    strong_corr.append({
-                        "variable1": corr_matrix.columns[i],
-                        "variable2": corr_matrix.columns[j],
-                        "correlation": float(corr_value),
-                        "strength": "strong positive" if corr_value > 0 else "strong negative"
-                    })
-        
-        return strong_corr
-    
+        # Paires du triangle supérieur filtrées en un seul masque vectorisé
+        idx_i, idx_j = np.triu_indices(len(columns), k=1)
+        values = corr_matrix[idx_i, idx_j]
+        mask = np.abs(values) >= threshold
+
+        return [
+            {
+                "variable1": columns[i],
+                "variable2": columns[j],
+                "correlation": float(value),
+                "strength": "strong positive" if value > 0 else "strong negative"
+            }
+            for i, j, value in zip(idx_i[mask], idx_j[mask], values[mask])
+        ]
+
     @staticmethod
-    def generate_insights(db: Session) -> List[Insight]:
+    async def generate_insights(db: AsyncSession) -> List[Insight]:
         """
         Génère automatiquement des insights
-        
+
         Args:
             db: Session de base de données
-            
+
         Returns:
             Liste d'insights générés
         """
         insights = []
-        
+
+        def _insight_row(**kwargs) -> Dict[str, any]:
+            """Ligne d'insert avec les colonnes optionnelles à None par défaut"""
+            row = {
+                "formation_type": None,
+                "formateur_id": None,
+                "date_range_start": None,
+                "date_range_end": None,
+            }
+            row.update(kwargs)
+            return row
+
         # 1. Identifier les formations avec satisfaction faible
-        low_satisfaction = db.query(
-            Evaluation.type_formation,
-            func.avg(Evaluation.satisfaction).label('avg_sat')
-        ).group_by(
-            Evaluation.type_formation
-        ).having(
-            func.avg(Evaluation.satisfaction) < 3
-        ).all()
-        
+        low_satisfaction = (await db.execute(
+            select(
+                Evaluation.type_formation,
+                func.avg(Evaluation.satisfaction).label('avg_sat')
+            ).group_by(
+                Evaluation.type_formation
+            ).having(
+                func.avg(Evaluation.satisfaction) < 3
+            )
+        )).all()
+
         for formation, avg_sat in low_satisfaction:
-            insight = Insight(
+            insights.append(_insight_row(
                 insight_type="signal_faible",
                 title=f"Attention: Satisfaction faible pour {formation}",
                 description=f"La formation '{formation}' a une satisfaction moyenne de {avg_sat:.2f}/5, "
@@ -268,24 +345,25 @@ class AnalyticsService:
                 data={"formation": formation, "avg_satisfaction": float(avg_sat)},
                 confidence=0.9,
                 formation_type=formation
-            )
-            insights.append(insight)
-        
+            ))
+
         # 2. Identifier les formateurs excellents
-        top_formateurs = db.query(
-            Evaluation.formateur_id,
-            func.avg(Evaluation.satisfaction).label('avg_sat'),
-            func.count(Evaluation.id).label('count')
-        ).group_by(
-            Evaluation.formateur_id
-        ).having(
-            func.avg(Evaluation.satisfaction) >= 4.5
-        ).having(
-            func.count(Evaluation.id) >= 5
-        ).all()
-        
+        top_formateurs = (await db.execute(
+            select(
+                Evaluation.formateur_id,
+                func.avg(Evaluation.satisfaction).label('avg_sat'),
+                func.count(Evaluation.id).label('count')
+            ).group_by(
+                Evaluation.formateur_id
+            ).having(
+                func.avg(Evaluation.satisfaction) >= 4.5
+            ).having(
+                func.count(Evaluation.id) >= 5
+            )
+        )).all()
+
         for formateur, avg_sat, count in top_formateurs:
-            insight = Insight(
+            insights.append(_insight_row(
                 insight_type="tendance",
                 title=f"Formateur excellent: {formateur}",
                 description=f"Le formateur {formateur} obtient une satisfaction exceptionnelle de "
@@ -293,33 +371,35 @@ class AnalyticsService:
                 data={"formateur": formateur, "avg_satisfaction": float(avg_sat), "evaluations": count},
                 confidence=0.95,
                 formateur_id=formateur
-            )
-            insights.append(insight)
-        
-        # 3. Analyser les tendances sentiment récentes
+            ))
+
+        # 3. Analyser les tendances sentiment récentes (comptage en SQL)
         recent_date = datetime.utcnow() - timedelta(days=7)
-        recent_analyses = db.query(Analysis).join(
-            Evaluation
-        ).filter(
-            Evaluation.date >= recent_date
-        ).all()
-        
-        if recent_analyses:
+        recent_counts = (await db.execute(
+            select(
+                Analysis.sentiment,
+                func.count(Analysis.id)
+            ).join(Evaluation).where(
+                Evaluation.date >= recent_date
+            ).group_by(Analysis.sentiment)
+        )).all()
+
+        if recent_counts:
             sentiment_counts = {
                 SentimentEnum.POSITIVE.value: 0,
                 SentimentEnum.NEUTRAL.value: 0,
                 SentimentEnum.NEGATIVE.value: 0
             }
-            
-            for analysis in recent_analyses:
-                if analysis.sentiment in sentiment_counts:
-                    sentiment_counts[analysis.sentiment] += 1
-            
+
+            for sentiment, count in recent_counts:
+                if sentiment in sentiment_counts:
+                    sentiment_counts[sentiment] += count
+
             total = sum(sentiment_counts.values())
             negative_pct = (sentiment_counts[SentimentEnum.NEGATIVE.value] / total * 100) if total > 0 else 0
-            
+
             if negative_pct > 30:
-                insight = Insight(
+                insights.append(_insight_row(
                     insight_type="trend",
                     title="Augmentation des sentiments négatifs",
                     description=f"{negative_pct:.1f}% des évaluations récentes (7 derniers jours) "
@@ -328,64 +408,67 @@ class AnalyticsService:
                     confidence=0.8,
                     date_range_start=recent_date,
                     date_range_end=datetime.utcnow()
-                )
-                insights.append(insight)
-        
-        # Sauvegarder les insights
-        for insight in insights:
-            db.add(insight)
-        
+                ))
+
+        # Sauvegarder les insights en un seul INSERT multi-lignes
+        if not insights:
+            return []
+
         try:
-            db.commit()
-            logger.info(f"Generated {len(insights)} new insights")
+            created = (await db.execute(
+                insert(Insight).returning(Insight), insights
+            )).scalars().all()
+            await db.commit()
+            logger.info(f"Generated {len(created)} new insights")
+            return created
         except Exception as e:
             logger.error(f"Error saving insights: {e}")
-            db.rollback()
-        
-        return insights
-    
+            await db.rollback()
+            return []
+
     @staticmethod
-    def compare_formations(
-        db: Session,
+    async def compare_formations(
+        db: AsyncSession,
         formation1: str,
         formation2: str
     ) -> Dict[str, any]:
         """
         Compare deux types de formation
-        
+
         Args:
             db: Session
             formation1: Premier type de formation
             formation2: Deuxième type de formation
-            
+
         Returns:
             Comparaison détaillée
         """
         stats = {}
-        
+
         for formation in [formation1, formation2]:
-            evals = db.query(Evaluation).filter(
-                Evaluation.type_formation == formation
-            ).all()
-            
-            if evals:
-                df = pd.DataFrame([{
-                    "satisfaction": e.satisfaction,
-                    "contenu": e.contenu,
-                    "logistique": e.logistique,
-                    "applicabilite": e.applicabilite,
-                } for e in evals])
-                
+            rows = (await db.execute(
+                select(
+                    Evaluation.satisfaction,
+                    Evaluation.contenu,
+                    Evaluation.logistique,
+                    Evaluation.applicabilite
+                ).where(Evaluation.type_formation == formation)
+            )).all()
+
+            if rows:
+                # Moyennes colonne par colonne sur le tableau numpy
+                means = np.asarray(rows, dtype=np.float64).mean(axis=0)
+
                 stats[formation] = {
-                    "count": len(evals),
-                    "satisfaction": float(df['satisfaction'].mean()),
-                    "contenu": float(df['contenu'].mean()),
-                    "logistique": float(df['logistique'].mean()),
-                    "applicabilite": float(df['applicabilite'].mean()),
+                    "count": len(rows),
+                    "satisfaction": float(means[0]),
+                    "contenu": float(means[1]),
+                    "logistique": float(means[2]),
+                    "applicabilite": float(means[3]),
                 }
             else:
                 stats[formation] = None
-        
+
         return {
             "formation1": formation1,
             "formation2": formation2,
@@ -2,13 +2,21 @@
 Service de clustering des évaluations
 """
 from sklearn.cluster import KMeans, DBSCAN
-from sklearn.preprocessing import StandardScaler
+from joblib import Parallel, delayed
+import hashlib
 import numpy as np
 from typing import List, Dict, Optional, Tuple
 from sentence_transformers import SentenceTransformer
 import logging
 from app.core.config import settings
 
+# faiss est optionnel: repli sur scikit-learn s'il n'est pas installé
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 
@@ -22,6 +30,23 @@ class ClusteringService:
         self.embedding_model = SentenceTransformer(
             "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
         )
+        # Cache d'embeddings keyé par hash du texte: les commentaires
+        # identiques (ou re-soumis) ne repassent pas dans le modèle.
+        # Stocké en float16 (mémoire divisée par deux, précision suffisante
+        # pour le clustering)
+        self._embedding_cache: Dict[str, np.ndarray] = {}
+        self._embedding_cache_max = 10000
+        # Résultats de la méthode du coude par empreinte de dataset:
+        # évite de relancer max_k entraînements KMeans sur le même batch
+        self._elbow_cache: Dict[tuple, int] = {}
+        
+        # Passage à vide: amorce le tokenizer et les buffers du modèle pour
+        # que le premier batch réel n'en paie pas le coût
+        try:
+            self.embedding_model.encode(["warmup"], show_progress_bar=False)
+        except Exception as e:
+            logger.warning(f"Embedding model warmup failed: {e}")
+        
         logger.info("ClusteringService initialized with multilingual embeddings")
     
     def get_embeddings(self, texts: List[str]) -> np.ndarray:
@@ -38,16 +63,62 @@ class ClusteringService:
             return np.array([])
         
         try:
-            embeddings = self.embedding_model.encode(
-                texts,
-                show_progress_bar=False,
-                batch_size=settings.BATCH_SIZE
-            )
-            return embeddings
+            keys = [
+                hashlib.sha1(text.encode("utf-8")).hexdigest() for text in texts
+            ]
+            
+            # Servir depuis le cache tout ce qui a déjà été encodé
+            results: Dict[int, np.ndarray] = {}
+            for i, key in enumerate(keys):
+                cached = self._embedding_cache.get(key)
+                if cached is not None:
+                    results[i] = cached
+            
+            to_encode = [i for i in range(len(texts)) if i not in results]
+            if to_encode:
+                batch_texts = [texts[i] for i in to_encode]
+                encoded = self.embedding_model.encode(
+                    batch_texts,
+                    show_progress_bar=False,
+                    batch_size=self._tune_batch_size(batch_texts)
+                )
+                for i, embedding in zip(to_encode, encoded):
+                    results[i] = embedding
+                    if len(self._embedding_cache) < self._embedding_cache_max:
+                        self._embedding_cache[keys[i]] = embedding.astype(np.float16)
+            
+            # float32 en sortie: c'est ce qu'attendent scikit-learn et pgvector
+            return np.stack(
+                [results[i] for i in range(len(texts))]
+            ).astype(np.float32, copy=False)
         except Exception as e:
             logger.error(f"Error generating embeddings: {e}")
             return np.array([])
     
+    @staticmethod
+    def _tune_batch_size(texts: List[str]) -> int:
+        """
+        Ajuste la taille de batch d'encodage à la longueur des textes
+        
+        Le modèle padde chaque batch à la longueur de sa plus longue
+        séquence (et trie déjà les textes par longueur): des commentaires
+        courts supportent de gros batchs, des commentaires longs saturent
+        la mémoire plus vite. On vise un budget de tokens à peu près
+        constant par batch.
+        
+        Args:
+            texts: Textes à encoder
+            
+        Returns:
+            Taille de batch à passer à encode()
+        """
+        avg_len = sum(len(text) for text in texts) / max(1, len(texts))
+        if avg_len > 512:
+            return max(8, settings.BATCH_SIZE // 4)
+        if avg_len > 256:
+            return max(16, settings.BATCH_SIZE // 2)
+        return settings.BATCH_SIZE
+    
     # HDBSCAN removed - not available without C compilation
     # Using KMeans and DBSCAN as alternatives
     
@@ -82,27 +153,49 @@ class ClusteringService:
                 logger.info(f"Auto-detected optimal clusters: {n_clusters}")
         
         try:
-            # Normaliser les embeddings
-            scaler = StandardScaler()
-            scaled_embeddings = scaler.fit_transform(embeddings)
-            
-            # K-Means
-            kmeans = KMeans(
-                n_clusters=n_clusters,
-                random_state=42,
-                n_init=10
-            )
-            cluster_labels = kmeans.fit_predict(scaled_embeddings)
+            # Les embeddings SentenceTransformer sont déjà sur une échelle
+            # homogène: le StandardScaler ne faisait que déformer les
+            # distances cosinus/euclidiennes et coûter une passe complète
+            data = np.ascontiguousarray(embeddings, dtype=np.float32)
+            
+            if FAISS_AVAILABLE:
+                # K-Means faiss: entraînement et affectation nettement plus
+                # rapides que scikit-learn sur les embeddings denses
+                kmeans = faiss.Kmeans(
+                    data.shape[1],
+                    n_clusters,
+                    niter=20,
+                    seed=42,
+                    verbose=False
+                )
+                kmeans.train(data)
+                _, assignments = kmeans.index.search(data, 1)
+                cluster_labels = assignments.ravel()
+                inertia = float(kmeans.obj[-1]) if len(kmeans.obj) else 0.0
+                centroids = kmeans.centroids.tolist()
+                method = "faiss-kmeans"
+            else:
+                kmeans = KMeans(
+                    n_clusters=n_clusters,
+                    random_state=42,
+                    n_init=10
+                )
+                cluster_labels = kmeans.fit_predict(data)
+                inertia = float(kmeans.inertia_)
+                centroids = kmeans.cluster_centers_.tolist()
+                method = "kmeans"
+            
+            # Tailles de clusters en un seul passage vectorisé
+            counts = np.bincount(cluster_labels, minlength=n_clusters)
             
             cluster_info = {
-                "method": "kmeans",
+                "method": method,
                 "n_clusters": n_clusters,
-                "inertia": float(kmeans.inertia_),
+                "inertia": inertia,
                 "cluster_sizes": {
-                    int(label): int(np.sum(cluster_labels == label))
-                    for label in range(n_clusters)
+                    int(label): int(counts[label]) for label in range(n_clusters)
                 },
-                "centroids": kmeans.cluster_centers_.tolist()
+                "centroids": centroids
             }
             
             return cluster_labels, cluster_info
@@ -135,17 +228,18 @@ class ClusteringService:
             dbscan = DBSCAN(eps=eps, min_samples=min_samples)
             cluster_labels = dbscan.fit_predict(embeddings)
             
-            unique_labels = set(cluster_labels)
+            # np.unique donne labels et tailles en un seul passage
+            unique_labels, counts = np.unique(cluster_labels, return_counts=True)
+            n_noise = int(counts[unique_labels == -1].sum())
             n_clusters = len(unique_labels) - (1 if -1 in unique_labels else 0)
-            n_noise = list(cluster_labels).count(-1)
             
             cluster_info = {
                 "method": "dbscan",
                 "n_clusters": n_clusters,
                 "n_noise": n_noise,
                 "cluster_sizes": {
-                    int(label): int(np.sum(cluster_labels == label))
-                    for label in unique_labels if label != -1
+                    int(label): int(count)
+                    for label, count in zip(unique_labels, counts) if label != -1
                 },
                 "outliers": n_noise
             }
@@ -160,6 +254,7 @@ class ClusteringService:
         self,
         texts: List[str],
         method: Optional[str] = None,
+        embeddings: Optional[np.ndarray] = None,
         **kwargs
     ) -> Tuple[np.ndarray, np.ndarray, Dict[str, any]]:
         """
@@ -168,13 +263,15 @@ class ClusteringService:
         Args:
             texts: Liste de textes à clustériser
             method: Méthode de clustering (kmeans, dbscan)
+            embeddings: Embeddings précalculés (évite un ré-encodage)
             **kwargs: Paramètres supplémentaires pour la méthode
             
         Returns:
             Tuple (embeddings, cluster_labels, cluster_info)
         """
-        # Générer les embeddings
-        embeddings = self.get_embeddings(texts)
+        # Générer les embeddings si non fournis
+        if embeddings is None:
+            embeddings = self.get_embeddings(texts)
         
         if len(embeddings) == 0:
             return np.array([]), np.array([]), {}
@@ -212,24 +309,38 @@ class ClusteringService:
         
         max_k = min(max_k, len(embeddings) // 2)
         
-        inertias = []
+        data32 = np.ascontiguousarray(embeddings, dtype=np.float32)
+        fingerprint = (
+            len(embeddings),
+            max_k,
+            hashlib.sha1(data32.tobytes()).hexdigest()
+        )
+        cached = self._elbow_cache.get(fingerprint)
+        if cached is not None:
+            return cached
+        
         K_range = range(2, max_k + 1)
         
-        scaler = StandardScaler()
-        scaled_embeddings = scaler.fit_transform(embeddings)
+        def _fit_inertia(k: int) -> float:
+            return KMeans(n_clusters=k, random_state=42, n_init=5).fit(data32).inertia_
         
-        for k in K_range:
-            kmeans = KMeans(n_clusters=k, random_state=42, n_init=5)
-            kmeans.fit(scaled_embeddings)
-            inertias.append(kmeans.inertia_)
+        # Les fits sont indépendants et libèrent le GIL dans le code natif:
+        # on les lance en parallèle sur des threads
+        inertias = Parallel(n_jobs=settings.MAX_WORKERS, prefer="threads")(
+            delayed(_fit_inertia)(k) for k in K_range
+        )
         
         # Trouver le coude (approche simple)
         if len(inertias) >= 2:
             diffs = np.diff(inertias)
-            optimal_k = np.argmax(diffs) + 2  # +2 car on commence à k=2
-            return int(optimal_k)
+            optimal_k = int(np.argmax(diffs) + 2)  # +2 car on commence à k=2
+        else:
+            optimal_k = 3  # Par défaut
+        
+        if len(self._elbow_cache) < 100:
+            self._elbow_cache[fingerprint] = optimal_k
         
-        return 3  # Par défaut
+        return optimal_k
 
 
 # Instance globale
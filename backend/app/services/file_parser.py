@@ -1,17 +1,61 @@
 """
 Service de parsing de fichiers (CSV, PDF, Excel)
 """
+import sys
 import pandas as pd
-import PyPDF2
-import pdfplumber
-from typing import List, Dict, Optional, Union
+from typing import BinaryIO, List, Dict, Optional, Union
 import logging
 from datetime import datetime
 import io
+from joblib import Parallel, delayed
+from app.core.config import settings
 from app.models.models import EvaluationCreate
 
 logger = logging.getLogger(__name__)
 
+# Backend PDF résolu au premier besoin: les bibliothèques PDF sont
+# lourdes à importer et inutiles pour les uploads CSV/Excel
+_fitz = None
+_fitz_checked = False
+
+
+def _get_fitz():
+    """
+    Retourne le module PyMuPDF, ou None s'il n'est pas installé
+    
+    PyMuPDF ouvre et tokenise les PDF en C, nettement plus vite que
+    pdfplumber (pur Python). Repli sur pdfplumber si non disponible.
+    """
+    global _fitz, _fitz_checked
+    if not _fitz_checked:
+        try:
+            import fitz  # PyMuPDF
+            _fitz = fitz
+        except ImportError:
+            _fitz = None
+        _fitz_checked = True
+    return _fitz
+
+
+def _extract_page_tables(pdf_bytes: bytes, page_number: int) -> List[list]:
+    """
+    Extrait les tables d'une seule page (worker du pool de processus)
+    
+    Fonction de module pour rester picklable; chaque worker rouvre le
+    document depuis les octets reçus.
+    """
+    fitz = _get_fitz()
+    if fitz is not None:
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        try:
+            return [table.extract() for table in doc[page_number].find_tables()]
+        finally:
+            doc.close()
+    
+    import pdfplumber
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        return pdf.pages[page_number].extract_tables() or []
+
 
 class FileParser:
     """
@@ -33,8 +77,34 @@ class FileParser:
         'date': ['date', 'evaluation_date', 'eval_date'],
     }
     
+    # Lookup inverse alias -> nom standard, construit une fois au
+    # chargement de la classe
+    ALIAS_TO_STANDARD = {
+        alias: standard_name
+        for standard_name, aliases in REQUIRED_COLUMNS.items()
+        for alias in aliases
+    }
+    
+    @staticmethod
+    def _to_stream(file_content: Union[bytes, str, BinaryIO]) -> Union[BinaryIO, io.StringIO]:
+        """
+        Retourne un flux lisible sans copier le contenu s'il s'agit déjà d'un fichier
+        
+        Args:
+            file_content: Contenu brut (bytes/str) ou objet fichier
+            
+        Returns:
+            Objet fichier positionné au début
+        """
+        if isinstance(file_content, bytes):
+            return io.BytesIO(file_content)
+        if isinstance(file_content, str):
+            return io.StringIO(file_content)
+        file_content.seek(0)
+        return file_content
+    
     @classmethod
-    def parse_csv(cls, file_content: Union[bytes, str], filename: str) -> List[EvaluationCreate]:
+    def parse_csv(cls, file_content: Union[bytes, str, BinaryIO], filename: str) -> List[EvaluationCreate]:
         """
         Parse un fichier CSV
         
@@ -46,27 +116,28 @@ class FileParser:
             Liste d'objets EvaluationCreate
         """
         try:
-            # Lire le CSV
-            if isinstance(file_content, bytes):
-                df = pd.read_csv(io.BytesIO(file_content))
-            else:
-                df = pd.read_csv(io.StringIO(file_content))
-            
-            # Normaliser les noms de colonnes
-            df = cls._normalize_columns(df)
-            
-            # Valider les colonnes requises
-            cls._validate_columns(df)
-            
-            # Convertir en liste d'évaluations
+            # Lire le CSV par tranches: seule la tranche courante est en
+            # mémoire, quel que soit le volume du fichier
             evaluations = []
-            for idx, row in df.iterrows():
-                try:
-                    eval_data = cls._row_to_evaluation(row, filename)
-                    evaluations.append(eval_data)
-                except Exception as e:
-                    logger.warning(f"Error parsing row {idx}: {e}")
-                    continue
+            first_chunk = True
+            
+            with pd.read_csv(
+                cls._to_stream(file_content),
+                chunksize=cls._CSV_CHUNK_SIZE,
+                dtype=cls._CSV_DTYPES
+            ) as reader:
+                for df in reader:
+                    # Normaliser les noms de colonnes
+                    df = cls._normalize_columns(df)
+                    
+                    # Valider les colonnes requises (une fois suffit,
+                    # les tranches partagent le même en-tête)
+                    if first_chunk:
+                        cls._validate_columns(df)
+                        first_chunk = False
+                    
+                    # Convertir en liste d'évaluations (colonne par colonne)
+                    evaluations.extend(cls._dataframe_to_evaluations(df, filename))
             
             logger.info(f"Parsed {len(evaluations)} evaluations from CSV")
             return evaluations
@@ -76,7 +147,7 @@ class FileParser:
             raise ValueError(f"Invalid CSV format: {e}")
     
     @classmethod
-    def parse_excel(cls, file_content: bytes, filename: str) -> List[EvaluationCreate]:
+    def parse_excel(cls, file_content: Union[bytes, BinaryIO], filename: str) -> List[EvaluationCreate]:
         """
         Parse un fichier Excel
         
@@ -89,7 +160,7 @@ class FileParser:
         """
         try:
             # Lire le fichier Excel
-            df = pd.read_excel(io.BytesIO(file_content))
+            df = pd.read_excel(cls._to_stream(file_content))
             
             # Normaliser les noms de colonnes
             df = cls._normalize_columns(df)
@@ -97,15 +168,8 @@ class FileParser:
             # Valider les colonnes requises
             cls._validate_columns(df)
             
-            # Convertir en liste d'évaluations
-            evaluations = []
-            for idx, row in df.iterrows():
-                try:
-                    eval_data = cls._row_to_evaluation(row, filename)
-                    evaluations.append(eval_data)
-                except Exception as e:
-                    logger.warning(f"Error parsing row {idx}: {e}")
-                    continue
+            # Convertir en liste d'évaluations (colonne par colonne)
+            evaluations = cls._dataframe_to_evaluations(df, filename)
             
             logger.info(f"Parsed {len(evaluations)} evaluations from Excel")
             return evaluations
@@ -115,7 +179,7 @@ class FileParser:
             raise ValueError(f"Invalid Excel format: {e}")
     
     @classmethod
-    def parse_pdf(cls, file_content: bytes, filename: str) -> List[EvaluationCreate]:
+    def parse_pdf(cls, file_content: Union[bytes, BinaryIO], filename: str) -> List[EvaluationCreate]:
         """
         Parse un fichier PDF (tables extraites)
         
@@ -129,43 +193,30 @@ class FileParser:
         try:
             evaluations = []
             
-            # Essayer avec pdfplumber pour extraire les tables
-            with pdfplumber.open(io.BytesIO(file_content)) as pdf:
-                all_tables = []
+            all_tables = cls._extract_pdf_tables(file_content)
+            
+            if not all_tables:
+                raise ValueError("No tables found in PDF")
+            
+            # Convertir chaque table en DataFrame
+            # Supposer que la première ligne est l'en-tête
+            for table in all_tables:
+                if len(table) < 2:
+                    continue
                 
-                for page in pdf.pages:
-                    tables = page.extract_tables()
-                    if tables:
-                        all_tables.extend(tables)
+                df = pd.DataFrame(table[1:], columns=table[0])
                 
-                if not all_tables:
-                    raise ValueError("No tables found in PDF")
+                # Normaliser et valider
+                df = cls._normalize_columns(df)
                 
-                # Convertir la première table en DataFrame
-                # Supposer que la première ligne est l'en-tête
-                for table in all_tables:
-                    if len(table) < 2:
-                        continue
-                    
-                    df = pd.DataFrame(table[1:], columns=table[0])
-                    
-                    # Normaliser et valider
-                    df = cls._normalize_columns(df)
-                    
-                    try:
-                        cls._validate_columns(df)
-                    except ValueError:
-                        # Cette table n'a pas le bon format
-                        continue
-                    
-                    # Convertir en évaluations
-                    for idx, row in df.iterrows():
-                        try:
-                            eval_data = cls._row_to_evaluation(row, filename)
-                            evaluations.append(eval_data)
-                        except Exception as e:
-                            logger.warning(f"Error parsing PDF row {idx}: {e}")
-                            continue
+                try:
+                    cls._validate_columns(df)
+                except ValueError:
+                    # Cette table n'a pas le bon format
+                    continue
+                
+                # Convertir en évaluations (colonne par colonne)
+                evaluations.extend(cls._dataframe_to_evaluations(df, filename))
             
             if not evaluations:
                 raise ValueError("No valid evaluation data found in PDF")
@@ -177,6 +228,161 @@ class FileParser:
             logger.error(f"Error parsing PDF file: {e}")
             raise ValueError(f"Invalid PDF format: {e}")
     
+    # En dessous de ce nombre de pages, le démarrage du pool coûte plus
+    # cher que l'extraction elle-même
+    _PDF_PARALLEL_MIN_PAGES = 4
+    
+    # Taille des tranches de lecture CSV: borne la mémoire au lieu de
+    # matérialiser tout le fichier en un seul DataFrame
+    _CSV_CHUNK_SIZE = 10000
+    
+    # Indices de types pour read_csv: épargne l'inférence de type sur les
+    # colonnes texte/identifiants (tous leurs aliases connus). Les scores
+    # et dates restent inférés puis coercés en aval, pour tolérer les
+    # valeurs invalides.
+    _CSV_DTYPES = {
+        alias: str
+        for standard_name, aliases in REQUIRED_COLUMNS.items()
+        if standard_name in {'evaluation_id', 'formation_id', 'type_formation',
+                             'formateur_id', 'commentaire', 'langue'}
+        for alias in aliases
+    }
+    
+    @classmethod
+    def _extract_pdf_tables(cls, file_content: Union[bytes, BinaryIO]) -> List[list]:
+        """
+        Extrait les tables du PDF (PyMuPDF si disponible, sinon pdfplumber)
+        
+        Les pages des gros documents sont traitées en parallèle par un
+        pool de processus (l'extraction est purement CPU).
+        
+        Args:
+            file_content: Contenu du fichier PDF
+            
+        Returns:
+            Liste de tables (listes de lignes)
+        """
+        pdf_bytes = cls._to_stream(file_content).read()
+        n_pages = cls._count_pdf_pages(pdf_bytes)
+        
+        if n_pages >= cls._PDF_PARALLEL_MIN_PAGES:
+            per_page = Parallel(n_jobs=min(settings.MAX_WORKERS, n_pages))(
+                delayed(_extract_page_tables)(pdf_bytes, page_number)
+                for page_number in range(n_pages)
+            )
+            # Aplatir en conservant l'ordre des pages
+            return [table for tables in per_page for table in tables]
+        
+        return [
+            table
+            for page_number in range(n_pages)
+            for table in _extract_page_tables(pdf_bytes, page_number)
+        ]
+    
+    @classmethod
+    def _count_pdf_pages(cls, pdf_bytes: bytes) -> int:
+        """Retourne le nombre de pages du document"""
+        fitz = _get_fitz()
+        if fitz is not None:
+            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+            try:
+                return doc.page_count
+            finally:
+                doc.close()
+        
+        import pdfplumber
+        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+            return len(pdf.pages)
+    
+    @classmethod
+    def _dataframe_to_evaluations(cls, df: pd.DataFrame, source_file: str) -> List[EvaluationCreate]:
+        """
+        Convertit un DataFrame normalisé en évaluations (traitement par colonnes)
+        
+        Les conversions (dates, scores, textes) se font en une passe
+        vectorisée par colonne au lieu d'une passe Python par ligne.
+        
+        Args:
+            df: DataFrame normalisé et validé
+            source_file: Nom du fichier source
+            
+        Returns:
+            Liste d'objets EvaluationCreate
+        """
+        try:
+            now = datetime.utcnow()
+            
+            # Dates: conversion vectorisée, valeurs invalides -> maintenant
+            dates = pd.to_datetime(df['date'], errors='coerce')
+            date_list = [
+                d.to_pydatetime() if pd.notna(d) else now for d in dates
+            ]
+            
+            # Scores: conversion numérique vectorisée, défaut 3
+            score_cols = {}
+            for col in ('satisfaction', 'contenu', 'logistique', 'applicabilite'):
+                score_cols[col] = (
+                    pd.to_numeric(df[col], errors='coerce').fillna(3).astype(int).tolist()
+                )
+            
+            # Champs texte (catégoriels internés, cf. _row_to_evaluation)
+            eval_ids = df['evaluation_id'].astype(str).tolist()
+            formation_ids = [sys.intern(v) for v in df['formation_id'].astype(str).tolist()]
+            type_formations = [sys.intern(v) for v in df['type_formation'].astype(str).tolist()]
+            formateur_ids = [sys.intern(v) for v in df['formateur_id'].astype(str).tolist()]
+            commentaires = df['commentaire'].fillna("").astype(str).tolist()
+            langues = [
+                sys.intern(str(v)) if pd.notna(v) else None for v in df['langue']
+            ]
+            
+            evaluations = []
+            for i in range(len(df)):
+                fields = dict(
+                    evaluation_id=eval_ids[i],
+                    formation_id=formation_ids[i],
+                    type_formation=type_formations[i],
+                    formateur_id=formateur_ids[i],
+                    satisfaction=score_cols['satisfaction'][i],
+                    contenu=score_cols['contenu'][i],
+                    logistique=score_cols['logistique'][i],
+                    applicabilite=score_cols['applicabilite'][i],
+                    commentaire=commentaires[i],
+                    langue=langues[i],
+                    date=date_list[i]
+                )
+                try:
+                    if all(
+                        1 <= fields[col] <= 5
+                        for col in ('satisfaction', 'contenu',
+                                    'logistique', 'applicabilite')
+                    ):
+                        # Types et défauts déjà garantis par le nettoyage
+                        # colonne par colonne: model_construct saute la
+                        # re-validation champ par champ
+                        evaluations.append(EvaluationCreate.model_construct(**fields))
+                    else:
+                        # Scores hors bornes: la validation pydantic
+                        # signale et la ligne est ignorée, comme avant
+                        evaluations.append(EvaluationCreate(**fields))
+                except Exception as e:
+                    logger.warning(f"Error parsing row {i}: {e}")
+                    continue
+            
+            return evaluations
+            
+        except Exception as e:
+            # Repli: conversion ligne par ligne
+            logger.warning(f"Vectorized conversion failed, falling back to rows: {e}")
+            evaluations = []
+            # itertuples évite la construction d'une Series par ligne
+            for idx, row in enumerate(df.itertuples(index=False)):
+                try:
+                    evaluations.append(cls._row_to_evaluation(row._asdict(), source_file))
+                except Exception as e:
+                    logger.warning(f"Error parsing row {idx}: {e}")
+                    continue
+            return evaluations
+    
     @classmethod
     def _normalize_columns(cls, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -191,13 +397,12 @@ class FileParser:
         # Convertir les noms en minuscules et supprimer espaces
         df.columns = df.columns.str.lower().str.strip()
         
-        # Mapper les aliases vers les noms standards
-        column_mapping = {}
-        for standard_name, aliases in cls.REQUIRED_COLUMNS.items():
-            for col in df.columns:
-                if col in aliases:
-                    column_mapping[col] = standard_name
-                    break
+        # Mapper les aliases vers les noms standards (lookup O(1) par colonne)
+        column_mapping = {
+            col: cls.ALIAS_TO_STANDARD[col]
+            for col in df.columns
+            if col in cls.ALIAS_TO_STANDARD
+        }
         
         df = df.rename(columns=column_mapping)
         return df
@@ -221,12 +426,12 @@ class FileParser:
             raise ValueError(f"Missing required columns: {missing}")
     
     @classmethod
-    def _row_to_evaluation(cls, row: pd.Series, source_file: str) -> EvaluationCreate:
+    def _row_to_evaluation(cls, row: Dict, source_file: str) -> EvaluationCreate:
         """
         Convertit une ligne en EvaluationCreate
         
         Args:
-            row: Ligne du DataFrame
+            row: Ligne du DataFrame sous forme de dict
             source_file: Nom du fichier source
             
         Returns:
@@ -253,27 +458,29 @@ class FileParser:
             except:
                 return default
         
+        # Les champs catégoriels se répètent sur des milliers de lignes:
+        # sys.intern fait pointer les doublons vers une seule chaîne
         return EvaluationCreate(
             evaluation_id=str(row['evaluation_id']),
-            formation_id=str(row['formation_id']),
-            type_formation=str(row['type_formation']),
-            formateur_id=str(row['formateur_id']),
+            formation_id=sys.intern(str(row['formation_id'])),
+            type_formation=sys.intern(str(row['type_formation'])),
+            formateur_id=sys.intern(str(row['formateur_id'])),
             satisfaction=to_int(row['satisfaction']),
             contenu=to_int(row['contenu']),
             logistique=to_int(row['logistique']),
             applicabilite=to_int(row['applicabilite']),
             commentaire=str(row['commentaire']) if not pd.isna(row['commentaire']) else "",
-            langue=str(row.get('langue', 'FR')) if not pd.isna(row.get('langue')) else None,
+            langue=sys.intern(str(row.get('langue', 'FR'))) if not pd.isna(row.get('langue')) else None,
             date=date_obj
         )
     
     @classmethod
-    def parse_file(cls, file_content: bytes, filename: str) -> List[EvaluationCreate]:
+    def parse_file(cls, file_content: Union[bytes, BinaryIO], filename: str) -> List[EvaluationCreate]:
         """
         Parse un fichier selon son extension
         
         Args:
-            file_content: Contenu du fichier
+            file_content: Contenu du fichier (bytes ou objet fichier)
             filename: Nom du fichier
             
         Returns:
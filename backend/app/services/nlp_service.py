@@ -2,8 +2,11 @@
 Service NLP principal orchestrant tous les services d'analyse
 """
 from typing import List, Dict, Optional
+from collections import Counter
+import asyncio
 import logging
-from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, update, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
 import numpy as np
 from app.models.models import (
     Evaluation, Analysis, Cluster, Theme,
@@ -27,11 +30,16 @@ class NLPService:
         self.sentiment_analyzer = get_sentiment_analyzer()
         self.topic_extractor = get_topic_extractor()
         self.clustering_service = get_clustering_service()
+        # Ids des thèmes déjà rencontrés, par (nom, langue): les batchs
+        # suivants incrémentent directement sans re-SELECT (les thèmes ne
+        # sont jamais supprimés, les ids restent valides)
+        self._theme_ids: Dict[tuple, int] = {}
+        self._theme_ids_max = 10000
     
-    def process_evaluation(
+    async def process_evaluation(
         self,
         evaluation: Evaluation,
-        db: Session
+        db: AsyncSession
     ) -> Analysis:
         """
         Traite une évaluation unique
@@ -68,21 +76,21 @@ class NLPService:
             sentiment_score=sentiment_result["score"],
             themes=themes,
             entities={},  # Pourrait être étendu avec NER
-            embedding=[],  # Sera rempli lors du clustering batch
+            embedding=None,  # Sera rempli lors du clustering batch
             model_version="1.0"
         )
         
         db.add(analysis)
         
         # Mettre à jour les thèmes globaux
-        self._update_global_themes(themes, final_lang, db)
+        await self._update_global_themes(themes, final_lang, db)
         
         return analysis
     
-    def process_batch(
+    async def process_batch(
         self,
         evaluations: List[Evaluation],
-        db: Session
+        db: AsyncSession
     ) -> List[Analysis]:
         """
         Traite un batch d'évaluations
@@ -101,69 +109,88 @@ class NLPService:
         
         # Extraire les commentaires et langues
         commentaires = [e.commentaire or "" for e in evaluations]
-        langues = []
         
-        # Détecter les langues
-        for eval in evaluations:
-            if eval.langue:
-                langues.append(eval.langue)
-            else:
-                detected = self.language_detector.detect_language(eval.commentaire or "")
-                langues.append(detected)
-                eval.langue = detected
+        # Détecter les langues manquantes en un seul passage batch.
+        # Les étapes CPU (détection, thèmes, embeddings, clustering) sont
+        # déportées dans un thread: la tâche tourne sur la boucle
+        # d'événements et gèlerait sinon toutes les autres requêtes.
+        to_detect = [i for i, e in enumerate(evaluations) if not e.langue]
+        if to_detect:
+            detected = await asyncio.to_thread(
+                self.language_detector.detect_batch,
+                [commentaires[i] for i in to_detect]
+            )
+            for i, lang in zip(to_detect, detected):
+                evaluations[i].langue = lang
         
-        # 1. Analyse de sentiment batch
-        sentiment_results = self.sentiment_analyzer.analyze_batch(commentaires, langues)
+        langues = [e.langue for e in evaluations]
         
-        # 2. Extraction de thèmes batch
-        themes_list, topic_info = self.topic_extractor.extract_themes_batch(commentaires, langues)
+        # 1. Analyse de sentiment batch (appels API concurrents, sans
+        # bloquer la boucle d'événements)
+        sentiment_results = await self.sentiment_analyzer.analyze_batch_async(
+            commentaires, langues
+        )
         
+        # 2. Extraction de thèmes batch
+        themes_list, topic_info = await asyncio.to_thread(
+            self.topic_extractor.extract_themes_batch, commentaires, langues
+        )
+
         # 3. Générer embeddings pour clustering
-        embeddings = self.clustering_service.get_embeddings(commentaires)
+        embeddings = await asyncio.to_thread(
+            self.clustering_service.get_embeddings, commentaires
+        )
         
-        # Créer les analyses
-        analyses = []
+        # Convertir la matrice d'embeddings en une seule passe C plutôt
+        # qu'une conversion ligne par ligne au moment de la sérialisation
+        embedding_rows = embeddings.tolist() if len(embeddings) > 0 else None
+        
+        # Préparer les lignes d'analyses (insérées en un seul INSERT plus bas)
+        analysis_rows = []
         all_themes_to_update = []  # Collecter tous les thèmes pour update en batch
         
         for i, evaluation in enumerate(evaluations):
-            analysis = Analysis(
-                evaluation_id=evaluation.id,
-                detected_language=langues[i],
-                sentiment=sentiment_results[i]["sentiment"],
-                sentiment_score=sentiment_results[i]["score"],
-                themes=themes_list[i] if i < len(themes_list) else [],
-                entities={},
-                embedding=embeddings[i].tolist() if len(embeddings) > 0 else [],
-                model_version="1.0"
-            )
-            analyses.append(analysis)
-            db.add(analysis)
+            analysis_rows.append({
+                "evaluation_id": evaluation.id,
+                "detected_language": langues[i],
+                "sentiment": sentiment_results[i]["sentiment"],
+                "sentiment_score": sentiment_results[i]["score"],
+                "themes": themes_list[i] if i < len(themes_list) else [],
+                "entities": {},
+                "embedding": embedding_rows[i] if embedding_rows else None,
+                "model_version": "1.0",
+                "cluster_id": None
+            })
             
             # Collecter les thèmes pour mise à jour groupée
             if i < len(themes_list) and themes_list[i]:
                 all_themes_to_update.append((themes_list[i], langues[i]))
         
-        self._update_global_themes_batch(all_themes_to_update, db)
+        await self._update_global_themes_batch(all_themes_to_update, db)
         
-        # 4. Clustering
+        # 4. Clustering (assigne cluster_id sur les lignes avant insertion)
         if len(embeddings) > 0:
-            self._perform_clustering(analyses, embeddings, commentaires, db)
+            await self._perform_clustering(analysis_rows, embeddings, commentaires, db)
         
         try:
-            db.commit()
+            # Un seul INSERT executemany au lieu d'un add par analyse
+            analyses = (await db.execute(
+                insert(Analysis).returning(Analysis), analysis_rows
+            )).scalars().all()
+            await db.commit()
             logger.info(f"Successfully processed {len(analyses)} evaluations")
         except Exception as e:
             logger.error(f"Error committing analyses: {e}")
-            db.rollback()
+            await db.rollback()
             raise
         
-        return analyses
+        return list(analyses)
     
-    def _update_global_themes(
+    async def _update_global_themes(
         self,
         themes: List[str],
         language: str,
-        db: Session
+        db: AsyncSession
     ) -> None:
         """
         Met à jour les thèmes globaux dans la base de données
@@ -173,109 +200,114 @@ class NLPService:
             language: Langue
             db: Session
         """
-        for theme_name in themes:
-            if not theme_name:
-                continue
-            
-            # Chercher si le thème existe déjà
-            theme = db.query(Theme).filter(
-                Theme.theme_name == theme_name,
-                Theme.language == language
-            ).first()
-            
-            if theme:
-                # Incrémenter la fréquence
-                theme.frequency += 1
-            else:
-                # Créer un nouveau thème
-                theme = Theme(
-                    theme_name=theme_name,
-                    frequency=1,
-                    keywords=[theme_name],
-                    language=language
-                )
-                db.add(theme)
+        # Même chemin que le batch: un seul SELECT IN + cache d'ids,
+        # au lieu d'un SELECT par thème
+        await self._update_global_themes_batch([(themes, language)], db)
     
-    def _perform_clustering(
+    async def _perform_clustering(
         self,
-        analyses: List[Analysis],
+        analysis_rows: List[Dict],
         embeddings: np.ndarray,
         texts: List[str],
-        db: Session
+        db: AsyncSession
     ) -> None:
         """
         Effectue le clustering et crée les clusters
         
         Args:
-            analyses: Liste des analyses
+            analysis_rows: Lignes d'analyses (dicts) pas encore insérées
             embeddings: Embeddings correspondants
             texts: Textes originaux
             db: Session
         """
         try:
-            # Effectuer le clustering
-            _, cluster_labels, cluster_info = self.clustering_service.cluster(
+            # Effectuer le clustering (réutilise les embeddings du batch)
+            # dans un thread pour ne pas bloquer la boucle d'événements
+            _, cluster_labels, cluster_info = await asyncio.to_thread(
+                self.clustering_service.cluster,
                 texts,
-                method="kmeans"
+                method="kmeans",
+                embeddings=embeddings
+            )
+            
+            labels = np.asarray(cluster_labels)
+            valid = labels != -1  # Exclure les outliers
+            if not valid.any():
+                logger.info("Created 0 clusters")
+                return
+            
+            # Agrégats par cluster en une passe numpy (groupby sur les
+            # labels): tailles, sentiments moyens et centroïdes de tous
+            # les clusters d'un coup au lieu d'un masque par cluster
+            n_groups = int(labels[valid].max()) + 1
+            counts = np.bincount(labels[valid], minlength=n_groups)
+            sentiment_scores = np.asarray(
+                [row["sentiment_score"] for row in analysis_rows],
+                dtype=np.float64
+            )
+            sentiment_sums = np.bincount(
+                labels[valid], weights=sentiment_scores[valid], minlength=n_groups
             )
+            centroid_sums = np.zeros(
+                (n_groups, embeddings.shape[1]), dtype=np.float64
+            )
+            np.add.at(centroid_sums, labels[valid], embeddings[valid])
+            
+            # Bucketiser les indices par label avec un seul argsort au
+            # lieu d'un scan np.where complet par cluster
+            order = np.argsort(labels, kind='stable')
+            unique_labels, starts = np.unique(labels[order], return_index=True)
+            bounds = np.append(starts[1:], len(order))
             
             # Créer ou récupérer les clusters
             cluster_map = {}  # label -> Cluster object
             
-            for label in set(cluster_labels):
+            for label, start, end in zip(unique_labels, starts, bounds):
+                label = int(label)
                 if label == -1:  # Outliers
                     continue
                 
-                # Trouver les indices de ce cluster
-                indices = np.where(cluster_labels == label)[0]
+                # Indices de ce cluster
+                indices = order[start:end]
                 
                 # Calculer les thèmes représentatifs
                 cluster_themes = []
                 for idx in indices:
-                    if analyses[idx].themes:
-                        cluster_themes.extend(analyses[idx].themes)
+                    if analysis_rows[idx]["themes"]:
+                        cluster_themes.extend(analysis_rows[idx]["themes"])
                 
                 # Prendre les thèmes les plus fréquents
-                from collections import Counter
                 theme_counts = Counter(cluster_themes)
                 top_themes = [theme for theme, _ in theme_counts.most_common(5)]
                 
-                # Calculer le sentiment moyen
-                cluster_sentiments = [analyses[idx].sentiment_score for idx in indices]
-                avg_sentiment = float(np.mean(cluster_sentiments))
-                
-                # Centroïde
-                cluster_embeddings = embeddings[indices]
-                centroid = np.mean(cluster_embeddings, axis=0).tolist()
-                
-                # Créer le cluster
+                # Créer le cluster (agrégats précalculés ci-dessus)
                 cluster = Cluster(
                     cluster_label=f"Cluster {label}",
                     cluster_number=int(label),
-                    size=len(indices),
+                    size=int(counts[label]),
                     representative_themes=top_themes,
-                    avg_sentiment=avg_sentiment,
-                    centroid=centroid
+                    avg_sentiment=float(sentiment_sums[label] / counts[label]),
+                    centroid=(centroid_sums[label] / counts[label]).tolist()
                 )
                 db.add(cluster)
-                db.flush()  # Pour obtenir l'ID
+                await db.flush()  # Pour obtenir l'ID
                 
                 cluster_map[label] = cluster
             
-            # Assigner les clusters aux analyses
+            # Assigner les clusters aux lignes d'analyses
             for i, label in enumerate(cluster_labels):
                 if label != -1 and label in cluster_map:
-                    analyses[i].cluster_id = cluster_map[label].id
+                    analysis_rows[i]["cluster_id"] = cluster_map[label].id
             
             logger.info(f"Created {len(cluster_map)} clusters")
             
         except Exception as e:
             logger.error(f"Error in clustering: {e}")
     
-    def _update_global_themes_batch(
+    async def _update_global_themes_batch(
         self,
         themes_data: List[tuple],  # [(themes_list, language), ...]
-        db: Session
+        db: AsyncSession
     ) -> None:
         """
         Met à jour les thèmes globaux en batch pour éviter les duplicatas
@@ -284,41 +316,79 @@ class NLPService:
             themes_data: Liste de tuples (themes_list, language)
             db: Session
         """
-        from collections import Counter
-        
-        # Compter tous les thèmes par langue
-        theme_counts = {}
+        # Compter tous les thèmes par (nom, langue); Counter.update
+        # consomme le générateur en C au lieu d'un incrément par thème
+        theme_counts = Counter()
         for themes, language in themes_data:
-            if language not in theme_counts:
-                theme_counts[language] = Counter()
-            theme_counts[language].update(themes)
-        
-        # Mettre à jour en batch
-        for language, counter in theme_counts.items():
-            for theme_name, count in counter.items():
-                if not theme_name:
-                    continue
-                
-                # Chercher si le thème existe déjà
-                theme = db.query(Theme).filter(
-                    Theme.theme_name == theme_name,
-                    Theme.language == language
-                ).first()
-                
+            theme_counts.update(
+                (theme_name, language) for theme_name in themes if theme_name
+            )
+        
+        if not theme_counts:
+            return
+        
+        # Paires déjà vues: incrément SQL direct via l'id en cache,
+        # sans aucun SELECT
+        cached_updates = []
+        to_resolve = {}
+        for (theme_name, language), count in theme_counts.items():
+            theme_id = self._theme_ids.get((theme_name, language))
+            if theme_id is not None:
+                cached_updates.append({"tid": theme_id, "inc": count})
+            else:
+                to_resolve[(theme_name, language)] = count
+        
+        if cached_updates:
+            await db.execute(
+                update(Theme)
+                .where(Theme.id == bindparam("tid"))
+                .values(frequency=Theme.frequency + bindparam("inc")),
+                cached_updates
+            )
+        
+        # Un seul SELECT IN pour les paires restantes
+        new_rows = []
+        if to_resolve:
+            existing = (await db.execute(
+                select(Theme).where(
+                    Theme.theme_name.in_({name for name, _ in to_resolve})
+                )
+            )).scalars().all()
+            existing_map = {(t.theme_name, t.language): t for t in existing}
+            
+            # Incréments sur l'existant, INSERT groupé pour le reste
+            for (theme_name, language), count in to_resolve.items():
+                theme = existing_map.get((theme_name, language))
                 if theme:
-                    # Incrémenter la fréquence
                     theme.frequency += count
+                    self._remember_theme_id(theme_name, language, theme.id)
                 else:
-                    # Créer un nouveau thème
-                    theme = Theme(
-                        theme_name=theme_name,
-                        frequency=count,
-                        keywords=[theme_name],
-                        language=language
-                    )
-                    db.add(theme)
-        
-        logger.info(f"Updated themes for {len(theme_counts)} languages")
+                    new_rows.append({
+                        "theme_name": theme_name,
+                        "frequency": count,
+                        "keywords": [theme_name],
+                        "language": language
+                    })
+            
+            if new_rows:
+                created = (await db.execute(
+                    insert(Theme).returning(
+                        Theme.id, Theme.theme_name, Theme.language
+                    ),
+                    new_rows
+                )).all()
+                for theme_id, theme_name, language in created:
+                    self._remember_theme_id(theme_name, language, theme_id)
+        
+        logger.info(
+            f"Updated {len(theme_counts)} themes ({len(new_rows)} new, "
+            f"{len(cached_updates)} from id cache)"
+        )
+    
+    def _remember_theme_id(self, theme_name: str, language: str, theme_id: int) -> None:
+        """Mémorise l'id d'un thème pour les prochains batchs"""
+        if len(self._theme_ids) < self._theme_ids_max:
+            self._theme_ids[(theme_name, language)] = theme_id
 
 
 # Instance globale
@@ -1,7 +1,14 @@
 """
 Service d'analyse de sentiment multilingue utilisant Hugging Face API
 """
+import asyncio
+import re
+import time
+import httpx
+import orjson
 import requests
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Tuple, Optional
 import logging
 import os
@@ -16,6 +23,65 @@ class SentimentAnalyzer:
     Analyseur de sentiment avec modèles spécialisés par langue via Hugging Face API
     """
     
+    # Fragments de labels par polarité (l'ordre de test compte: un label
+    # comme '1_star' matche d'abord le fragment positif '1')
+    _POSITIVE_LABELS = ("pos", "positive", "1", "5_stars", "4_stars")
+    _NEGATIVE_LABELS = ("neg", "negative", "0", "1_star", "2_stars")
+    _NEUTRAL_LABELS = ("neu", "neutral", "3_stars")
+    
+    # Dispatch label exact -> polarité, précalculé après la classe et
+    # complété à la volée pour les labels inédits
+    _LABEL_POLARITY: Dict[str, int] = {}
+    
+    # Mots positifs (multilingue)
+    POSITIVE_WORDS = {
+        # Français
+        'excellent', 'très bien', 'parfait', 'super', 'génial', 'bon', 'bien',
+        'satisfait', 'satisfaisant', 'intéressant', 'utile', 'efficace',
+        'professionnel', 'compétent', 'clair', 'dynamique', 'enrichissant',
+        'pertinent', 'recommande',
+        # Arabe
+        'ممتاز', 'جيد', 'مفيد', 'رائع',
+        # Darija
+        'mezyan', 'mzyan', 'zwina', 'labas', 'top', 'kamel'
+    }
+    
+    # Mots négatifs (multilingue) - ÉLARGI pour mieux détecter
+    NEGATIVE_WORDS = {
+        # Français
+        'mauvais', 'nul', 'décevant', 'déçu', 'insatisfait', 'problème', 'difficile',
+        'compliqué', 'incompréhensible', 'ennuyeux', 'perte de temps', 'catastrophe',
+        'inutile', 'médiocre', 'faible', 'horrible', 'terrible', 'désastre',
+        'incompétent', 'mal', 'pire', 'vide', 'superficiel', 'obsolète',
+        'périmé', 'désengagé', 'agressif', 'fausse', 'erreur', 'pas terrible',
+        'manque', 'moyenne', 'correct sans plus', 'pas claire', 
+        # Arabe
+        'سيء', 'سيئة', 'ضعيف', 'قديم', 'غير', 'لا', 'مضيعة',
+        # Darija  
+        'khayb', 'khayba', 'machi mezyan', 'ma3lich', 'khsara', 'walo',
+        'ma kanet', 'f9ir', 'katastroph'
+    }
+    
+    # Alternations compilées une fois au chargement de la classe: une
+    # seule passe sur le texte au lieu d'un test d'inclusion par mot.
+    # Le lookahead autorise les chevauchements ('mezyan' dans
+    # 'machi mezyan') pour garder le même comptage.
+    _POSITIVE_RE = re.compile(
+        '(?=(' + '|'.join(
+            re.escape(w) for w in sorted(POSITIVE_WORDS, key=len, reverse=True)
+        ) + '))'
+    )
+    _NEGATIVE_RE = re.compile(
+        '(?=(' + '|'.join(
+            re.escape(w) for w in sorted(NEGATIVE_WORDS, key=len, reverse=True)
+        ) + '))'
+    )
+
+    # Tables d'expansion construites après la définition de la classe:
+    # chaque mot capturé est associé aux mots du lexique qu'il contient
+    _POSITIVE_EXPANSIONS: dict = {}
+    _NEGATIVE_EXPANSIONS: dict = {}
+    
     def __init__(self):
         self.api_key = os.getenv("HUGGINGFACE_API_KEY", "")
         self.api_url = "https://api-inference.huggingface.co/models/"
@@ -27,11 +93,41 @@ class SentimentAnalyzer:
             LanguageEnum.DARIJA.value: settings.DARIJA_MODEL,
         }
         
+        # Session partagée: réutilise les connexions TLS vers l'API au
+        # lieu d'un handshake complet par texte
+        self.session = requests.Session()
+        self.session.mount(
+            "https://",
+            requests.adapters.HTTPAdapter(
+                pool_connections=10,
+                pool_maxsize=max(10, settings.MAX_WORKERS)
+            )
+        )
+        if self.api_key:
+            self.session.headers["Authorization"] = f"Bearer {self.api_key}"
+        # Corps sérialisés avec orjson (voir _query_api*)
+        self.session.headers["Content-Type"] = "application/json"
+        
+        # Client async créé paresseusement (il doit naître dans la boucle
+        # d'événements qui l'utilise)
+        self._async_client: Optional[httpx.AsyncClient] = None
+        
+        # Cache LRU des analyses par (texte, langue): les commentaires
+        # dupliqués ne repaient pas l'appel API
+        self._analysis_cache: OrderedDict = OrderedDict()
+        self._analysis_cache_max = 5000
+        
         logger.info("SentimentAnalyzer initialized with Hugging Face API")
     
+    # Réessais sur erreurs transitoires (réseau, 429, 5xx — dont le 503
+    # "model loading" de Hugging Face), avec backoff exponentiel
+    _MAX_ATTEMPTS = 3
+    _BACKOFF_BASE = 1.0  # secondes: 1, 2, 4...
+    _RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+    
     def _query_api(self, model_name: str, text: str) -> Optional[Dict]:
         """
-        Interroge l'API Hugging Face
+        Interroge l'API Hugging Face (avec réessais sur erreur transitoire)
         
         Args:
             model_name: Nom du modèle
@@ -40,31 +136,150 @@ class SentimentAnalyzer:
         Returns:
             Résultat de l'API ou None si erreur
         """
-        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
         url = f"{self.api_url}{model_name}"
         
-        try:
-            response = requests.post(
-                url,
+        for attempt in range(self._MAX_ATTEMPTS):
+            try:
+                response = self.session.post(
+                    url,
+                    data=orjson.dumps({"inputs": text[:512]}),  # Limiter la longueur
+                    timeout=10
+                )
+                
+                if response.status_code == 200:
+                    result = orjson.loads(response.content)
+                    # L'API retourne une liste, prendre le premier élément
+                    if isinstance(result, list) and len(result) > 0:
+                        if isinstance(result[0], list):
+                            return result[0][0] if result[0] else None
+                        return result[0]
+                    return None
+                
+                if response.status_code not in self._RETRYABLE_STATUSES:
+                    logger.warning(f"API returned status {response.status_code}: {response.text}")
+                    return None
+                logger.warning(
+                    f"API returned status {response.status_code}, "
+                    f"attempt {attempt + 1}/{self._MAX_ATTEMPTS}"
+                )
+            except Exception as e:
+                logger.error(
+                    f"Error calling Hugging Face API "
+                    f"(attempt {attempt + 1}/{self._MAX_ATTEMPTS}): {e}"
+                )
+            
+            if attempt < self._MAX_ATTEMPTS - 1:
+                time.sleep(self._BACKOFF_BASE * (2 ** attempt))
+        
+        return None
+    
+    def _query_api_batch(self, model_name: str, texts: list) -> Optional[list]:
+        """
+        Interroge l'API Hugging Face pour plusieurs textes en un appel
+        
+        Args:
+            model_name: Nom du modèle
+            texts: Textes à analyser
+            
+        Returns:
+            Liste de résultats (un par texte) ou None si erreur
+        """
+        url = f"{self.api_url}{model_name}"
+        
+        for attempt in range(self._MAX_ATTEMPTS):
+            try:
+                response = self.session.post(
+                    url,
+                    data=orjson.dumps({"inputs": [text[:512] for text in texts]}),
+                    timeout=30
+                )
+                
+                if response.status_code == 200:
+                    result = orjson.loads(response.content)
+                    if isinstance(result, list) and len(result) == len(texts):
+                        # Chaque élément est la liste des labels du texte,
+                        # triée par score décroissant
+                        return [
+                            r[0] if isinstance(r, list) and r else r
+                            for r in result
+                        ]
+                    return None
+                
+                if response.status_code not in self._RETRYABLE_STATUSES:
+                    logger.warning(f"API returned status {response.status_code}: {response.text}")
+                    return None
+                logger.warning(
+                    f"API returned status {response.status_code}, "
+                    f"attempt {attempt + 1}/{self._MAX_ATTEMPTS}"
+                )
+            except Exception as e:
+                logger.error(
+                    f"Error calling Hugging Face API (batch, "
+                    f"attempt {attempt + 1}/{self._MAX_ATTEMPTS}): {e}"
+                )
+            
+            if attempt < self._MAX_ATTEMPTS - 1:
+                time.sleep(self._BACKOFF_BASE * (2 ** attempt))
+        
+        return None
+    
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """Retourne le client HTTP asynchrone partagé"""
+        if self._async_client is None:
+            headers = (
+                {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            )
+            headers["Content-Type"] = "application/json"
+            self._async_client = httpx.AsyncClient(
                 headers=headers,
-                json={"inputs": text[:512]},  # Limiter la longueur
-                timeout=10
+                timeout=30,
+                limits=httpx.Limits(
+                    max_connections=max(10, settings.MAX_WORKERS)
+                )
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                # L'API retourne une liste, prendre le premier élément
-                if isinstance(result, list) and len(result) > 0:
-                    if isinstance(result[0], list):
-                        return result[0][0] if result[0] else None
-                    return result[0]
-            else:
-                logger.warning(f"API returned status {response.status_code}: {response.text}")
-                return None
+        return self._async_client
+    
+    async def _query_api_batch_async(
+        self, model_name: str, texts: list
+    ) -> Optional[list]:
+        """
+        Variante asynchrone de _query_api_batch (même contrat)
+        """
+        url = f"{self.api_url}{model_name}"
+        
+        for attempt in range(self._MAX_ATTEMPTS):
+            try:
+                response = await self._get_async_client().post(
+                    url,
+                    content=orjson.dumps({"inputs": [text[:512] for text in texts]})
+                )
                 
-        except Exception as e:
-            logger.error(f"Error calling Hugging Face API: {e}")
-            return None
+                if response.status_code == 200:
+                    result = orjson.loads(response.content)
+                    if isinstance(result, list) and len(result) == len(texts):
+                        return [
+                            r[0] if isinstance(r, list) and r else r
+                            for r in result
+                        ]
+                    return None
+                
+                if response.status_code not in self._RETRYABLE_STATUSES:
+                    logger.warning(f"API returned status {response.status_code}: {response.text}")
+                    return None
+                logger.warning(
+                    f"API returned status {response.status_code}, "
+                    f"attempt {attempt + 1}/{self._MAX_ATTEMPTS}"
+                )
+            except Exception as e:
+                logger.error(
+                    f"Error calling Hugging Face API (async batch, "
+                    f"attempt {attempt + 1}/{self._MAX_ATTEMPTS}): {e}"
+                )
+            
+            if attempt < self._MAX_ATTEMPTS - 1:
+                await asyncio.sleep(self._BACKOFF_BASE * (2 ** attempt))
+        
+        return None
     
     def analyze(self, text: str, language: str) -> Dict[str, any]:
         """
@@ -85,6 +300,14 @@ class SentimentAnalyzer:
                 "label": "neutral"
             }
         
+        cached = self._cache_get(text, language)
+        if cached is not None:
+            return cached
+        
+        # Entrée triviale: l'appel API n'apporterait rien
+        if self._is_trivial(text):
+            return self._cache_put(text, language, self._rule_based_sentiment(text))
+        
         # Sélectionner le modèle approprié
         model_name = self.models.get(language, self.models[LanguageEnum.FRENCH.value])
         
@@ -96,19 +319,50 @@ class SentimentAnalyzer:
                 # Normaliser le résultat
                 sentiment, score = self._normalize_sentiment(result)
                 
-                return {
+                return self._cache_put(text, language, {
                     "sentiment": sentiment,
                     "score": score,
                     "confidence": result.get("score", 0.0),
                     "label": result.get("label", "neutral")
-                }
+                })
             except Exception as e:
                 logger.error(f"Error normalizing API result: {e}")
         
-        # Fallback sur analyse règle-based simple
+        # Fallback sur analyse règle-based simple, sans mise en cache:
+        # une panne passagère de l'API ne doit pas figer le résultat
+        # dégradé dans le cache (même règle que le chemin batch)
         logger.info(f"Using rule-based sentiment analysis for: {text[:50]}...")
         return self._rule_based_sentiment(text)
     
+    # Longueur en dessous de laquelle un texte n'apporte aucun signal
+    # exploitable par le modèle
+    _TRIVIAL_MAX_LEN = 3
+    
+    def _is_trivial(self, text: str) -> bool:
+        """
+        Vrai pour les entrées sans signal: quelques caractères, ou rien
+        d'alphabétique (ponctuation, notes chiffrées...)
+        """
+        stripped = text.strip()
+        if len(stripped) <= self._TRIVIAL_MAX_LEN:
+            return True
+        return not any(c.isalpha() for c in stripped)
+    
+    def _cache_get(self, text: str, language: str) -> Optional[Dict]:
+        """Lit le cache LRU (copie défensive) et rafraîchit l'entrée"""
+        cached = self._analysis_cache.get((text, language))
+        if cached is None:
+            return None
+        self._analysis_cache.move_to_end((text, language))
+        return dict(cached)
+    
+    def _cache_put(self, text: str, language: str, result: Dict) -> Dict:
+        """Mémorise un résultat d'analyse et le retourne"""
+        self._analysis_cache[(text, language)] = dict(result)
+        if len(self._analysis_cache) > self._analysis_cache_max:
+            self._analysis_cache.popitem(last=False)
+        return result
+    
     def _normalize_sentiment(self, result: Dict) -> Tuple[str, float]:
         """
         Normalise le résultat du modèle vers notre format standard
@@ -124,33 +378,39 @@ class SentimentAnalyzer:
         
         CONFIDENCE_THRESHOLD = 0.55  # 55% confidence minimum
         
-        # Mapper les labels vers notre format
-        if any(pos in label for pos in ["pos", "positive", "1", "5_stars", "4_stars"]):
+        # Lookup direct pour les labels déjà vus; un label inédit passe
+        # une seule fois par le scan de sous-chaînes puis est mémorisé
+        polarity = self._LABEL_POLARITY.get(label)
+        if polarity is None:
+            polarity = self._classify_label(label)
+            if len(self._LABEL_POLARITY) < 256:
+                self._LABEL_POLARITY[label] = polarity
+        
+        if polarity > 0:
             if confidence >= CONFIDENCE_THRESHOLD:
-                sentiment = SentimentEnum.POSITIVE.value
-                score = confidence
-            else:
-                # Confiance faible → neutral
-                sentiment = SentimentEnum.NEUTRAL.value
-                score = 0.0
-        elif any(neg in label for neg in ["neg", "negative", "0", "1_star", "2_stars"]):
+                return SentimentEnum.POSITIVE.value, confidence
+            # Confiance faible → neutral
+            return SentimentEnum.NEUTRAL.value, 0.0
+        if polarity < 0:
             if confidence >= CONFIDENCE_THRESHOLD:
-                sentiment = SentimentEnum.NEGATIVE.value
-                score = -confidence
-            else:
-                # Confiance faible → neutral
-                sentiment = SentimentEnum.NEUTRAL.value
-                score = 0.0
-        elif any(neu in label for neu in ["neu", "neutral", "3_stars"]):
-            # Neutre explicite
-            sentiment = SentimentEnum.NEUTRAL.value
-            score = 0.0
-        else:
-            # Label inconnu → neutral par défaut
-            sentiment = SentimentEnum.NEUTRAL.value
-            score = 0.0
+                return SentimentEnum.NEGATIVE.value, -confidence
+            # Confiance faible → neutral
+            return SentimentEnum.NEUTRAL.value, 0.0
+        # Neutre explicite ou label inconnu
+        return SentimentEnum.NEUTRAL.value, 0.0
+    
+    @classmethod
+    def _classify_label(cls, label: str) -> int:
+        """
+        Classe un label par scan de sous-chaînes (+1, -1 ou 0)
         
-        return sentiment, score
+        Même logique et même précédence que l'ancien any() en cascade.
+        """
+        if any(pos in label for pos in cls._POSITIVE_LABELS):
+            return 1
+        if any(neg in label for neg in cls._NEGATIVE_LABELS):
+            return -1
+        return 0
     
     def _rule_based_sentiment(self, text: str) -> Dict[str, any]:
         """
@@ -164,38 +424,18 @@ class SentimentAnalyzer:
         """
         text_lower = text.lower()
         
-        # Mots positifs (multilingue)
-        positive_words = {
-            # Français
-            'excellent', 'très bien', 'parfait', 'super', 'génial', 'bon', 'bien',
-            'satisfait', 'satisfaisant', 'intéressant', 'utile', 'efficace',
-            'professionnel', 'compétent', 'clair', 'dynamique', 'enrichissant',
-            'pertinent', 'recommande',
-            # Arabe
-            'ممتاز', 'جيد', 'مفيد', 'رائع',
-            # Darija
-            'mezyan', 'mzyan', 'zwina', 'labas', 'top', 'kamel'
-        }
-        
-        # Mots négatifs (multilingue) - ÉLARGI pour mieux détecter
-        negative_words = {
-            # Français
-            'mauvais', 'nul', 'décevant', 'déçu', 'insatisfait', 'problème', 'difficile',
-            'compliqué', 'incompréhensible', 'ennuyeux', 'perte de temps', 'catastrophe',
-            'inutile', 'médiocre', 'faible', 'horrible', 'terrible', 'désastre',
-            'incompétent', 'mal', 'pire', 'vide', 'superficiel', 'obsolète',
-            'périmé', 'désengagé', 'agressif', 'fausse', 'erreur', 'pas terrible',
-            'manque', 'moyenne', 'correct sans plus', 'pas claire', 
-            # Arabe
-            'سيء', 'سيئة', 'ضعيف', 'قديم', 'غير', 'لا', 'مضيعة',
-            # Darija  
-            'khayb', 'khayba', 'machi mezyan', 'ma3lich', 'khsara', 'walo',
-            'ma kanet', 'f9ir', 'katastroph'
-        }
-        
-        # Compter les occurrences
-        pos_count = sum(1 for word in positive_words if word in text_lower)
-        neg_count = sum(1 for word in negative_words if word in text_lower)
+        # Compter les mots distincts présents (une passe par alternation).
+        # À une position donnée l'alternation ne capture que la plus
+        # longue variante ('khayba' masquerait 'khayb'): chaque capture
+        # est donc étendue aux mots du lexique qu'elle contient
+        pos_found: set = set()
+        for captured in set(self._POSITIVE_RE.findall(text_lower)):
+            pos_found.update(self._POSITIVE_EXPANSIONS[captured])
+        neg_found: set = set()
+        for captured in set(self._NEGATIVE_RE.findall(text_lower)):
+            neg_found.update(self._NEGATIVE_EXPANSIONS[captured])
+        pos_count = len(pos_found)
+        neg_count = len(neg_found)
         
         # Déterminer le sentiment avec seuil plus bas pour négatif
         if neg_count > 0 and neg_count >= pos_count:  # Favoriser négatif si égalité
@@ -231,10 +471,182 @@ class SentimentAnalyzer:
         Returns:
             Liste de résultats d'analyse
         """
-        results = []
-        for text, lang in zip(texts, languages):
-            results.append(self.analyze(text, lang))
+        if len(texts) <= 1:
+            return [self.analyze(t, lang) for t, lang in zip(texts, languages)]
+        
+        results, jobs = self._prepare_batch(texts, languages)
+        
+        if len(jobs) > 1:
+            with ThreadPoolExecutor(
+                max_workers=min(settings.MAX_WORKERS, len(jobs))
+            ) as executor:
+                list(executor.map(
+                    lambda job: self._analyze_chunk(
+                        job[0], job[1], texts, languages, results
+                    ),
+                    jobs
+                ))
+        else:
+            for model_name, indices in jobs:
+                self._analyze_chunk(model_name, indices, texts, languages, results)
+        
         return results
+    
+    async def analyze_batch_async(
+        self, texts: list, languages: list
+    ) -> list:
+        """
+        Variante asynchrone d'analyze_batch: les appels groupés partent
+        en concurrence sur le client httpx sans bloquer la boucle
+        d'événements
+        
+        Args:
+            texts: Liste de textes
+            languages: Liste de codes langue correspondants
+            
+        Returns:
+            Liste de résultats d'analyse
+        """
+        results, jobs = self._prepare_batch(texts, languages)
+        
+        if jobs:
+            await asyncio.gather(*[
+                self._analyze_chunk_async(
+                    model_name, indices, texts, languages, results
+                )
+                for model_name, indices in jobs
+            ])
+        
+        return results
+    
+    def _prepare_batch(self, texts: list, languages: list) -> Tuple[list, list]:
+        """
+        Pré-remplit les textes vides et les hits de cache, et regroupe
+        le reste en tranches (modèle, indices) de taille BATCH_SIZE
+        
+        Returns:
+            Tuple (results pré-remplis, jobs à exécuter)
+        """
+        results: list = [None] * len(texts)
+        
+        # Regrouper les indices par modèle: un appel API par groupe au
+        # lieu d'un appel par texte
+        by_model: Dict[str, list] = {}
+        for i, (text, language) in enumerate(zip(texts, languages)):
+            if not text or not text.strip():
+                results[i] = {
+                    "sentiment": SentimentEnum.NEUTRAL.value,
+                    "score": 0.0,
+                    "confidence": 0.0,
+                    "label": "neutral"
+                }
+                continue
+            cached = self._cache_get(text, language)
+            if cached is not None:
+                results[i] = cached
+                continue
+            if self._is_trivial(text):
+                results[i] = self._cache_put(
+                    text, language, self._rule_based_sentiment(text)
+                )
+                continue
+            model_name = self.models.get(language, self.models[LanguageEnum.FRENCH.value])
+            by_model.setdefault(model_name, []).append(i)
+        
+        jobs = [
+            (model_name, indices[start:start + settings.BATCH_SIZE])
+            for model_name, indices in by_model.items()
+            for start in range(0, len(indices), settings.BATCH_SIZE)
+        ]
+        
+        return results, jobs
+    
+    async def _analyze_chunk_async(
+        self,
+        model_name: str,
+        indices: list,
+        texts: list,
+        languages: list,
+        results: list
+    ) -> None:
+        """Variante asynchrone de _analyze_chunk (même contrat)"""
+        api_results = await self._query_api_batch_async(
+            model_name, [texts[i] for i in indices]
+        )
+        self._fill_chunk_results(api_results, indices, texts, languages, results)
+    
+    def _analyze_chunk(
+        self,
+        model_name: str,
+        indices: list,
+        texts: list,
+        languages: list,
+        results: list
+    ) -> None:
+        """
+        Analyse une tranche de textes d'un même modèle en un appel API
+        
+        Remplit results aux positions d'origine; repli règle-based par
+        texte si l'appel groupé échoue.
+        """
+        api_results = self._query_api_batch(
+            model_name, [texts[i] for i in indices]
+        )
+        self._fill_chunk_results(api_results, indices, texts, languages, results)
+    
+    def _fill_chunk_results(
+        self,
+        api_results: Optional[list],
+        indices: list,
+        texts: list,
+        languages: list,
+        results: list
+    ) -> None:
+        """Normalise les résultats d'une tranche vers leurs positions"""
+        if api_results is None:
+            for i in indices:
+                results[i] = self._rule_based_sentiment(texts[i])
+            return
+        
+        for i, result in zip(indices, api_results):
+            if result:
+                try:
+                    sentiment, score = self._normalize_sentiment(result)
+                    results[i] = self._cache_put(texts[i], languages[i], {
+                        "sentiment": sentiment,
+                        "score": score,
+                        "confidence": result.get("score", 0.0),
+                        "label": result.get("label", "neutral")
+                    })
+                    continue
+                except Exception as e:
+                    logger.error(f"Error normalizing API result: {e}")
+            results[i] = self._rule_based_sentiment(texts[i])
+
+
+# Dispatch précalculé au chargement du module, via le même scan que le
+# repli pour garantir une précédence identique
+SentimentAnalyzer._LABEL_POLARITY.update({
+    label: SentimentAnalyzer._classify_label(label)
+    for label in (SentimentAnalyzer._POSITIVE_LABELS
+                  + SentimentAnalyzer._NEGATIVE_LABELS
+                  + SentimentAnalyzer._NEUTRAL_LABELS)
+})
+
+# Construites hors du corps de la classe (les attributs de classe ne
+# sont pas visibles depuis une compréhension imbriquée dans ce corps)
+SentimentAnalyzer._POSITIVE_EXPANSIONS.update({
+    word: frozenset(
+        other for other in SentimentAnalyzer.POSITIVE_WORDS if other in word
+    )
+    for word in SentimentAnalyzer.POSITIVE_WORDS
+})
+SentimentAnalyzer._NEGATIVE_EXPANSIONS.update({
+    word: frozenset(
+        other for other in SentimentAnalyzer.NEGATIVE_WORDS if other in word
+    )
+    for word in SentimentAnalyzer.NEGATIVE_WORDS
+})
 
 
 # Instance globale (singleton)
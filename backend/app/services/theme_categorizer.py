@@ -1,10 +1,13 @@
 """
 Service de catégorisation des thèmes en 4 catégories générales
 """
+import re
+from bisect import bisect_right
+import numpy as np
 from typing import Dict, List
 from collections import Counter
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import select, desc
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.models import Theme
 
 
@@ -50,6 +53,13 @@ class ThemeCategorizer:
         }
     }
     
+    # Clé de mots-clés par code langue (FR en repli)
+    LANGUAGE_KEYS = {
+        "FR": "keywords_fr",
+        "AR": "keywords_ar",
+        "DARIJA": "keywords_darija",
+    }
+    
     @classmethod
     def categorize_theme(cls, theme_name: str, language: str) -> str:
         """
@@ -63,29 +73,46 @@ class ThemeCategorizer:
             Nom de la catégorie
         """
         theme_lower = theme_name.lower()
+        if not theme_lower:
+            return cls.CATEGORY_ORDER[0]
+        keyword_key = cls.LANGUAGE_KEYS.get(language, "keywords_fr")
         
-        # Vérifier chaque catégorie
-        for category, keywords in cls.CATEGORIES.items():
-            # Sélectionner les bons keywords selon la langue
-            if language == "FR":
-                relevant_keywords = keywords.get("keywords_fr", [])
-            elif language == "AR":
-                relevant_keywords = keywords.get("keywords_ar", [])
-            elif language == "DARIJA":
-                relevant_keywords = keywords.get("keywords_darija", [])
-            else:
-                relevant_keywords = keywords.get("keywords_fr", [])  # Fallback
-            
-            # Vérifier si le thème contient un des mots-clés
-            for keyword in relevant_keywords:
-                if keyword in theme_lower or theme_lower in keyword:
-                    return category
+        # La précédence d'origine (première catégorie avec un mot-clé
+        # correspondant, dans un sens ou dans l'autre) devient: rang
+        # minimal parmi toutes les correspondances
+        best = len(cls.CATEGORY_ORDER)
+        
+        # Sens avant: mots-clés présents dans le thème, une seule passe
+        # regex sur le thème
+        forward_rank = cls._FORWARD_RANK[keyword_key]
+        for keyword in set(cls._FORWARD_RE[keyword_key].findall(theme_lower)):
+            rank = forward_rank[keyword]
+            if rank < best:
+                best = rank
+                if best == 0:
+                    break
+        
+        # Sens arrière: thème contenu dans un mot-clé, une recherche C
+        # dans la concaténation de tous les mots-clés de la langue
+        if best > 0:
+            joined, offsets, ranks = cls._REVERSE_INDEX[keyword_key]
+            pos = joined.find(theme_lower)
+            while pos != -1:
+                rank = ranks[bisect_right(offsets, pos) - 1]
+                if rank < best:
+                    best = rank
+                    if best == 0:
+                        break
+                pos = joined.find(theme_lower, pos + 1)
+        
+        if best < len(cls.CATEGORY_ORDER):
+            return cls.CATEGORY_ORDER[best]
         
         # Par défaut, catégoriser dans "Qualité de la Formation"
         return "Qualité de la Formation"
     
     @classmethod
-    def get_categorized_themes(cls, db: Session, top_n: int = 50) -> Dict[str, Dict]:
+    async def get_categorized_themes(cls, db: AsyncSession, top_n: int = 50) -> Dict[str, Dict]:
         """
         Récupère les thèmes et les groupe par catégorie
         
@@ -96,8 +123,14 @@ class ThemeCategorizer:
         Returns:
             Dict avec les 4 catégories et leurs stats
         """
-        # Récupérer les top thèmes
-        themes = db.query(Theme).order_by(desc(Theme.frequency)).limit(top_n).all()
+        # Récupérer les top thèmes: seules trois colonnes servent à
+        # l'agrégation, les lire en tuples évite de construire une
+        # entité ORM par ligne
+        result = await db.execute(
+            select(Theme.theme_name, Theme.frequency, Theme.language)
+            .order_by(desc(Theme.frequency))
+            .limit(top_n)
+        )
         
         # Initialiser les catégories
         categories = {
@@ -107,31 +140,79 @@ class ThemeCategorizer:
             "Applicabilité et Utilité": {"count": 0, "total_frequency": 0, "themes": []}
         }
         
-        # Catégoriser chaque thème
-        for theme in themes:
-            category = cls.categorize_theme(theme.theme_name, theme.language)
+        # Catégoriser chaque thème en itérant le résultat directement
+        for theme_name, frequency, language in result:
+            category = cls.categorize_theme(theme_name, language)
             
             categories[category]["count"] += 1
-            categories[category]["total_frequency"] += theme.frequency
+            categories[category]["total_frequency"] += frequency
             categories[category]["themes"].append({
-                "name": theme.theme_name,
-                "frequency": theme.frequency,
-                "language": theme.language
+                "name": theme_name,
+                "frequency": frequency,
+                "language": language
             })
         
-        # Calculer le pourcentage pour chaque catégorie
-        total_frequency = sum(cat["total_frequency"] for cat in categories.values())
+        # Calculer les pourcentages en une réduction numpy
+        frequencies = np.fromiter(
+            (cat["total_frequency"] for cat in categories.values()),
+            dtype=np.float64,
+            count=len(categories)
+        )
+        total_frequency = frequencies.sum()
+        if total_frequency > 0:
+            percentages = np.round(frequencies / total_frequency * 100, 1)
+        else:
+            percentages = np.zeros(len(categories))
         
-        for category in categories:
-            if total_frequency > 0:
-                categories[category]["percentage"] = round(
-                    (categories[category]["total_frequency"] / total_frequency) * 100, 1
-                )
-            else:
-                categories[category]["percentage"] = 0
+        for cat, percentage in zip(categories.values(), percentages):
+            cat["percentage"] = float(percentage)
         
         return categories
 
 
+# Index précalculés au chargement du module: une passe par sens au lieu
+# d'une double boucle catégories x mots-clés par thème
+ThemeCategorizer.CATEGORY_ORDER = list(ThemeCategorizer.CATEGORIES)
+ThemeCategorizer._FORWARD_RE = {}
+ThemeCategorizer._FORWARD_RANK = {}
+ThemeCategorizer._REVERSE_INDEX = {}
+
+for _key in ("keywords_fr", "keywords_ar", "keywords_darija"):
+    # Rang de catégorie (le plus petit gagne) par mot-clé
+    _rank_map = {}
+    for _rank, _keywords in enumerate(ThemeCategorizer.CATEGORIES.values()):
+        for _keyword in _keywords.get(_key, []):
+            _kw = _keyword.lower()
+            if _kw not in _rank_map or _rank < _rank_map[_kw]:
+                _rank_map[_kw] = _rank
+    
+    # Pour le sens avant, un mot-clé capturé doit aussi compter ses
+    # sous-mots-clés (l'alternation ne capture qu'un match par position)
+    _forward_rank = {
+        _kw: min(_r for _other, _r in _rank_map.items() if _other in _kw)
+        for _kw in _rank_map
+    }
+    
+    ThemeCategorizer._FORWARD_RANK[_key] = _forward_rank
+    ThemeCategorizer._FORWARD_RE[_key] = re.compile(
+        '(?=(' + '|'.join(
+            re.escape(_kw) for _kw in sorted(_rank_map, key=len, reverse=True)
+        ) + '))'
+    )
+    
+    # Concaténation séparée par NUL pour le sens arrière (le thème ne
+    # peut pas chevaucher deux mots-clés)
+    _parts, _offsets, _ranks = [], [], []
+    _pos = 0
+    for _kw, _rank in _rank_map.items():
+        _parts.append(_kw)
+        _offsets.append(_pos)
+        _ranks.append(_rank)
+        _pos += len(_kw) + 1
+    ThemeCategorizer._REVERSE_INDEX[_key] = (
+        '\x00'.join(_parts), _offsets, _ranks
+    )
+
+
 # Instance pour export
 theme_categorizer = ThemeCategorizer()
@@ -6,6 +6,7 @@ from typing import List, Dict, Optional, Tuple
 import logging
 from collections import Counter
 import numpy as np
+from joblib import Parallel, delayed
 from app.core.config import settings
 from app.models.models import LanguageEnum
 
@@ -17,6 +18,34 @@ class TopicExtractor:
     Extracteur de thèmes simple utilisant TF-IDF
     """
     
+    # Stop words par langue (partagés entre vectorizers et comptage direct)
+    FRENCH_STOP_WORDS = [
+        'le', 'la', 'les', 'un', 'une', 'des', 'de', 'du', 'à', 'au',
+        'et', 'ou', 'mais', 'donc', 'or', 'ni', 'car', 'que', 'qui',
+        'est', 'sont', 'était', 'ont', 'a', 'as', 'avez', 'ai',
+        'ce', 'cet', 'cette', 'ces', 'mon', 'ma', 'mes', 'ton', 'ta', 'tes',
+        'son', 'sa', 'ses', 'notre', 'nos', 'votre', 'vos', 'leur', 'leurs',
+        'je', 'tu', 'il', 'elle', 'nous', 'vous', 'ils', 'elles',
+        'pour', 'par', 'avec', 'sans', 'sur', 'sous', 'dans', 'en',
+        # Mots supplémentaires trop génériques
+        'tous', 'tout', 'toute', 'toutes', 'bien', 'très', 'plus', 'moins',
+        'comme', 'aucun', 'aucune', 'beaucoup', 'peu', 'assez', 'trop',
+        'même', 'aussi', 'encore', 'déjà', 'jamais', 'toujours', 'souvent',
+        'rien', 'quelque', 'plusieurs', 'quelques', 'certains', 'certaines',
+        'pas', 'non', 'oui', 'si', 'ne', 'n', 'y', 'd',
+    ]
+    
+    # Stop words arabes de base
+    ARABIC_STOP_WORDS = [
+        'في', 'من', 'إلى', 'على', 'عن', 'هذا', 'ذلك', 'التي', 'الذي',
+        'هو', 'هي', 'أن', 'كان', 'لم', 'لن', 'قد', 'لكن', 'أو', 'و'
+    ]
+    
+    DARIJA_STOP_WORDS = [
+        'dyal', 'dial', 'w', 'wla', 'ola', 'bach', 'bla', 
+        'hadi', 'hadak', 'hadik', 'hna', 'nta', 'nti', 'howa', 'hia'
+    ]
+    
     def __init__(self):
         # Vectorizers par langue
         self._vectorizers = {
@@ -24,51 +53,39 @@ class TopicExtractor:
             LanguageEnum.ARABIC.value: self._get_arabic_vectorizer(),
             LanguageEnum.DARIJA.value: self._get_darija_vectorizer(),
         }
+        
+        # Frozensets pour le comptage direct par texte
+        self._stop_word_sets = {
+            LanguageEnum.FRENCH.value: frozenset(self.FRENCH_STOP_WORDS),
+            LanguageEnum.ARABIC.value: frozenset(self.ARABIC_STOP_WORDS),
+            LanguageEnum.DARIJA.value: frozenset(self.DARIJA_STOP_WORDS),
+        }
+        
+        # Vocabulaire et fréquences documentaires par empreinte de corpus:
+        # les rappels sur un corpus inchangé sautent le fit complet
+        self._vocab_cache: Dict[tuple, tuple] = {}
+        self._vocab_cache_max = 20
     
     def _get_french_vectorizer(self) -> CountVectorizer:
         """Vectorizer pour le français avec stop words"""
-        french_stop_words = [
-            'le', 'la', 'les', 'un', 'une', 'des', 'de', 'du', 'à', 'au',
-            'et', 'ou', 'mais', 'donc', 'or', 'ni', 'car', 'que', 'qui',
-            'est', 'sont', 'était', 'ont', 'a', 'as', 'avez', 'ai',
-            'ce', 'cet', 'cette', 'ces', 'mon', 'ma', 'mes', 'ton', 'ta', 'tes',
-            'son', 'sa', 'ses', 'notre', 'nos', 'votre', 'vos', 'leur', 'leurs',
-            'je', 'tu', 'il', 'elle', 'nous', 'vous', 'ils', 'elles',
-            'pour', 'par', 'avec', 'sans', 'sur', 'sous', 'dans', 'en',
-            # Mots supplémentaires trop génériques
-            'tous', 'tout', 'toute', 'toutes', 'bien', 'très', 'plus', 'moins',
-            'comme', 'aucun', 'aucune', 'beaucoup', 'peu', 'assez', 'trop',
-            'même', 'aussi', 'encore', 'déjà', 'jamais', 'toujours', 'souvent',
-            'rien', 'quelque', 'plusieurs', 'quelques', 'certains', 'certaines',
-            'pas', 'non', 'oui', 'si', 'ne', 'n', 'y', 'd',
-        ]
         return CountVectorizer(
-            stop_words=french_stop_words,
+            stop_words=self.FRENCH_STOP_WORDS,
             ngram_range=(1, 3),
             min_df=2
         )
     
     def _get_arabic_vectorizer(self) -> CountVectorizer:
         """Vectorizer pour l'arabe"""
-        # Stop words arabes de base
-        arabic_stop_words = [
-            'في', 'من', 'إلى', 'على', 'عن', 'هذا', 'ذلك', 'التي', 'الذي',
-            'هو', 'هي', 'أن', 'كان', 'لم', 'لن', 'قد', 'لكن', 'أو', 'و'
-        ]
         return CountVectorizer(
-            stop_words=arabic_stop_words,
+            stop_words=self.ARABIC_STOP_WORDS,
             ngram_range=(1, 2),
             min_df=2
         )
     
     def _get_darija_vectorizer(self) -> CountVectorizer:
         """Vectorizer pour le Darija"""
-        darija_stop_words = [
-            'dyal', 'dial', 'w', 'wla', 'ola', 'bach', 'bla', 
-            'hadi', 'hadak', 'hadik', 'hna', 'nta', 'nti', 'howa', 'hia'
-        ]
         return CountVectorizer(
-            stop_words=darija_stop_words,
+            stop_words=self.DARIJA_STOP_WORDS,
             ngram_range=(1, 3),
             min_df=2
         )
@@ -94,28 +111,31 @@ class TopicExtractor:
             return []
         
         try:
-            vectorizer = self._vectorizers.get(
-                language, 
-                self._vectorizers[LanguageEnum.FRENCH.value]
+            # Comptage direct: monter un fit_transform sklearn pour un
+            # document unique coûtait la construction d'un vocabulaire
+            # complet par appel (et min_df=2 le faisait systématiquement
+            # échouer sur un seul document)
+            stop_words = self._stop_word_sets.get(
+                language,
+                self._stop_word_sets[LanguageEnum.FRENCH.value]
             )
             
-            # Vectoriser le texte
-            X = vectorizer.fit_transform([text])
-            
-            feature_names = vectorizer.get_feature_names_out()
-            scores = X.toarray()[0]
-            
-            # Trier par score
-            top_indices = scores.argsort()[-top_n:][::-1]
-            themes = [feature_names[i] for i in top_indices if scores[i] > 0]
+            counts = Counter(
+                word for word in text.lower().split()
+                if len(word) > 3 and word not in stop_words
+            )
             
-            return themes
+            return [word for word, _ in counts.most_common(top_n)]
             
         except Exception as e:
             logger.error(f"Error extracting themes: {e}")
             # Fallback: simple word frequency
             return self._simple_keyword_extraction(text, top_n)
     
+    # En dessous de cette taille de batch, le pool coûte plus cher que
+    # le comptage lui-même
+    _BATCH_PARALLEL_MIN = 500
+    
     def extract_themes_batch(
         self,
         texts: List[str],
@@ -136,11 +156,42 @@ class TopicExtractor:
         if not texts:
             return [], {}
         
-        # Extraire les thèmes pour chaque texte individuellement
-        all_themes = []
+        # Dédupliquer: chaque couple (texte, langue) n'est extrait
+        # qu'une seule fois, les doublons partagent le résultat
+        unique_index: Dict[tuple, int] = {}
+        unique_texts: List[str] = []
+        unique_langs: List[str] = []
         for text, lang in zip(texts, languages):
-            themes = self.extract_themes_single(text, lang, top_n=5)
-            all_themes.append(themes)
+            key = (text, lang)
+            if key not in unique_index:
+                unique_index[key] = len(unique_texts)
+                unique_texts.append(text)
+                unique_langs.append(lang)
+        
+        if len(unique_texts) >= self._BATCH_PARALLEL_MIN and settings.MAX_WORKERS > 1:
+            # Gros batch: répartir des tranches contiguës sur un pool de
+            # processus (comptage CPU pur, le GIL exclut les threads)
+            n_jobs = min(settings.MAX_WORKERS, len(unique_texts))
+            chunk_size = -(-len(unique_texts) // n_jobs)  # ceil
+            parts = Parallel(n_jobs=n_jobs)(
+                delayed(self._extract_chunk)(
+                    unique_texts[i:i + chunk_size],
+                    unique_langs[i:i + chunk_size]
+                )
+                for i in range(0, len(unique_texts), chunk_size)
+            )
+            unique_themes = [themes for part in parts for themes in part]
+        else:
+            # Extraire les thèmes pour chaque texte individuellement
+            unique_themes = [
+                self.extract_themes_single(text, lang, top_n=5)
+                for text, lang in zip(unique_texts, unique_langs)
+            ]
+        
+        all_themes = [
+            unique_themes[unique_index[(text, lang)]]
+            for text, lang in zip(texts, languages)
+        ]
         
         topic_info = {
             "method": "tfidf",
@@ -149,6 +200,17 @@ class TopicExtractor:
         
         return all_themes, topic_info
     
+    def _extract_chunk(
+        self,
+        texts: List[str],
+        languages: List[str]
+    ) -> List[List[str]]:
+        """Extrait les thèmes d'une tranche de batch (worker du pool)"""
+        return [
+            self.extract_themes_single(text, lang, top_n=5)
+            for text, lang in zip(texts, languages)
+        ]
+    
     def _simple_keyword_extraction(self, text: str, top_n: int = 5) -> List[str]:
         """
         Extraction simple de mots-clés par fréquence
@@ -193,22 +255,67 @@ class TopicExtractor:
         Returns:
             Liste de dicts avec theme, frequency, language
         """
-        # Extraire les thèmes pour chaque texte
-        all_themes, _ = self.extract_themes_batch(texts, languages)
-        
-        # Compter les thèmes globaux par langue
-        theme_counts = {}
-        for themes, lang in zip(all_themes, languages):
-            for theme in themes:
-                key = (theme, lang)
-                theme_counts[key] = theme_counts.get(key, 0) + 1
-        
-        # Trier et formater
-        sorted_themes = sorted(
-            theme_counts.items(), 
-            key=lambda x: x[1], 
-            reverse=True
-        )[:top_n]
+        if not texts:
+            return []
+        
+        # Regrouper les textes par langue
+        by_language: Dict[str, List[str]] = {}
+        for text, lang in zip(texts, languages):
+            if text and text.strip():
+                by_language.setdefault(lang, []).append(text)
+        
+        # Une seule vectorisation par langue sur tout le corpus, au lieu
+        # d'une extraction texte par texte; min_df=2 prend ici tout son
+        # sens (termes présents dans au moins deux commentaires)
+        entries = []
+        for lang, lang_texts in by_language.items():
+            # Corpus déjà vectorisé lors d'un appel précédent?
+            fingerprint = (lang, len(lang_texts), hash(tuple(lang_texts)))
+            cached = self._vocab_cache.get(fingerprint)
+            if cached is not None:
+                feature_names, doc_freq = cached
+            else:
+                vectorizer = self._vectorizers.get(
+                    lang, self._vectorizers[LanguageEnum.FRENCH.value]
+                )
+                # Dédupliquer avant vectorisation: chaque texte unique est
+                # analysé une fois et pondéré par son nombre d'occurrences
+                text_counts = Counter(lang_texts)
+                unique_texts = list(text_counts)
+                try:
+                    X = vectorizer.fit_transform(unique_texts)
+                except ValueError:
+                    # Corpus trop petit pour min_df: aucune contribution
+                    continue
+                
+                feature_names = vectorizer.get_feature_names_out()
+                # Fréquence documentaire, doublons comptés via leur poids
+                weights = np.fromiter(
+                    (text_counts[text] for text in unique_texts),
+                    dtype=np.int64
+                )
+                doc_freq = np.asarray(
+                    (X > 0).multiply(weights[:, None]).sum(axis=0)
+                ).ravel()
+                
+                if len(self._vocab_cache) < self._vocab_cache_max:
+                    self._vocab_cache[fingerprint] = (feature_names, doc_freq)
+            
+            # argpartition isole les top_n en O(n), le tri complet ne
+            # porte plus que sur ces top_n candidats
+            if top_n < len(doc_freq):
+                candidates = np.argpartition(doc_freq, -top_n)[-top_n:]
+                top_indices = candidates[np.argsort(doc_freq[candidates])[::-1]]
+            else:
+                top_indices = doc_freq.argsort()[::-1]
+            for idx in top_indices:
+                if doc_freq[idx] > 0:
+                    entries.append(
+                        (feature_names[idx], lang, int(doc_freq[idx]))
+                    )
+        
+        # Fusionner les langues et garder le top global
+        entries.sort(key=lambda entry: entry[2], reverse=True)
         
         return [
             {
@@ -217,7 +324,7 @@ class TopicExtractor:
                 "frequency": count,
                 "keywords": [theme]  # Pourrait être étendu
             }
-            for (theme, lang), count in sorted_themes
+            for theme, lang, count in entries[:top_n]
         ]
 
 